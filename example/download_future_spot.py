@@ -16,48 +16,19 @@ def main():
     
     symbols = list(set(spots.keys()) & set(futures.keys()))
     
-    dfs_spot = []
-    dfs_future = []
-    
-    for s in symbols:
-            try:
-                df_spot = qb.fetch_data(
-                    symbol=s,
-                    data_type="klines",
-                    asset_type="spot",
-                    start=max(pd.Timestamp("2024-08-24", tz="UTC"), spots[s].availableSince),
-                    end=spots[s].availableTo,
-                    timeframe="1m",
-                    use_async=True,
-                    save_local=True,
-                    limit_rate=None,  # 2 request per second, if set to None, no limit
-                )
-                df_spot["symbol"] = s
-                dfs_spot.append(df_spot)
-                
-                df_future = qb.fetch_data(
-                    symbol=s,
-                    data_type="klines",
-                    asset_type="futures/um",
-                    start=max(pd.Timestamp("2024-08-24", tz="UTC"), futures[s].availableSince),
-                    end=futures[s].availableTo,
-                    timeframe="1m",
-                    use_async=True,
-                    save_local=True,
-                    limit_rate=None,  # 2 request per second, if set to None, no limit
-                )
-                df_future["symbol"] = s
-                dfs_future.append(df_future)
-                
-            except Exception as e:
-                print(f"Error: {e}")
-    
-    df_spot = pd.concat(dfs_spot)
-    df_future = pd.concat(dfs_future)
-    
-    df_spot = pd.pivot_table(df_spot, index="datetime", columns="symbol", values="close")
-    df_future = pd.pivot_table(df_future, index="datetime", columns="symbol", values="close")
-    
+    start = pd.Timestamp("2024-08-24", tz="UTC")
+    end = pd.Timestamp.now(tz="UTC").normalize()
+
+    # one column of close prices per symbol, NaN before a symbol was listed. fetch_panel fails
+    # as a whole if any file can't be downloaded, but with save_local=True the files it got
+    # stay cached, so running the script again only fetches the rest
+    df_spot = qb.fetch_panel(
+        symbols, start, end, field="close", timeframe="1m", asset_type="spot", save_local=True
+    )
+    df_future = qb.fetch_panel(
+        symbols, start, end, field="close", timeframe="1m", asset_type="futures/um", save_local=True
+    )
+
     df_spot.to_parquet("spot.parquet")
     df_future.to_parquet("future.parquet")
 
@@ -2,13 +2,29 @@ from .api import (
     fetch_klines,
     fetch_agg_trades,
     fetch_data,
+    fetch_many,
+    fetch_panel,
+    iter_data,
+    sync,
+    sync_universe,
     fetch_book_ticker,
     fetch_funding_rate,
     fetch_trades,
     fetch_metrics,
     fetch_all_symbols,
+    fetch_symbol_table,
+    afetch_data,
+    afetch_klines,
+    afetch_agg_trades,
+    afetch_book_ticker,
+    afetch_funding_rate,
+    afetch_trades,
+    afetch_metrics,
     SymbolType,
 )
+from .throttle import AdaptiveLimiter
+from .store import compact_store, read_store
+from .cache import cache_stats, evict_cache, promote_daily_files
 from . import config  # Expose config module
 
 from importlib import metadata
@@ -22,11 +38,30 @@ __all__ = [
     "fetch_klines",
     "fetch_agg_trades",
     "fetch_data",
+    "fetch_many",
+    "fetch_panel",
+    "iter_data",
+    "sync",
+    "sync_universe",
     "fetch_book_ticker",
     "fetch_funding_rate",
     "fetch_trades",
     "fetch_metrics",
     "fetch_all_symbols",
+    "fetch_symbol_table",
+    "afetch_data",
+    "afetch_klines",
+    "afetch_agg_trades",
+    "afetch_book_ticker",
+    "afetch_funding_rate",
+    "afetch_trades",
+    "afetch_metrics",
+    "AdaptiveLimiter",
     "SymbolType",
+    "compact_store",
+    "read_store",
+    "promote_daily_files",
+    "evict_cache",
+    "cache_stats",
     "config",
 ]
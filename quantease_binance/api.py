@@ -1,30 +1,34 @@
 from datetime import datetime
-from typing import Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Mapping, Tuple
+import warnings
+import zipfile
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from pandas import DataFrame
-from dateutil import tz
-import asynciolimiter
+from dateutil import tz as dateutil_tz
 import ssl
 import certifi
 
+from .constants import KLINE_FREQS
 from .utils import Symbol
-from .utils import gen_dates, get_data, get_data_async, unify_datetime
+from .exceptions import NetworkError
+from .manifest import high_water_mark, lookup_files
+from .utils import compact_frame, gen_data_url, gen_dates, get_data, get_data_async, unify_datetime
+from .throttle import AdaptiveLimiter
 from . import config
 from typing import Optional, Union, List, Literal
 import asyncio
 import platform
 import aiohttp
+import httpx
 
 from tqdm import tqdm
 from tqdm.asyncio import tqdm 
-from tardis_dev import get_exchange_details
-from enum import Enum
-
-class SymbolType(Enum):
-    SPOT = "spot"
-    PERP = "perpetual"
-    FUTURE = "future"
+from .symbols import SymbolType, get_symbol_table
 
 
 def fetch_klines(
@@ -34,6 +38,7 @@ def fetch_klines(
     timeframe: str = "1m",
     asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -45,6 +50,7 @@ def fetch_klines(
         end=end,
         timeframe=timeframe,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_trades(
@@ -53,6 +59,7 @@ def fetch_trades(
     end: Union[str, datetime],
     asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -63,6 +70,7 @@ def fetch_trades(
         start=start,
         end=end,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_agg_trades(
@@ -71,6 +79,7 @@ def fetch_agg_trades(
     end: Union[str, datetime],
     asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -81,6 +90,7 @@ def fetch_agg_trades(
         start=start,
         end=end,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_book_ticker(
@@ -89,6 +99,7 @@ def fetch_book_ticker(
     end: Union[str, datetime],
     asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -99,6 +110,7 @@ def fetch_book_ticker(
         start=start,
         end=end,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_funding_rate(
@@ -107,6 +119,7 @@ def fetch_funding_rate(
     end: Union[str, datetime],
     asset_type: Literal["spot", "futures/um", "futures/cm"],
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -117,6 +130,7 @@ def fetch_funding_rate(
         start=start,
         end=end,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_metrics(
@@ -125,6 +139,7 @@ def fetch_metrics(
     end: Union[str, datetime],
     asset_type: Literal["spot", "futures/um", "futures/cm"],
     tz: Optional[str] = None,
+    compact: bool = False,
 ) -> DataFrame:
     """convinience function by calling ``fetch_data``"""
 
@@ -135,6 +150,7 @@ def fetch_metrics(
         start=start,
         end=end,
         tz=tz,
+        compact=compact,
     )
 
 def fetch_data(
@@ -148,6 +164,9 @@ def fetch_data(
     use_async: Optional[bool] = False,
     save_local: Optional[bool] = False,
     limit_rate: Optional[float] = None, # 3 requests per second
+    compact: bool = False,
+    columns: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
 ) -> DataFrame:
     """
     :param symbol: The binance market pair name. e.g. ``'BTCUSDT'``.
@@ -165,18 +184,85 @@ def fetch_data(
         `List of tz database time zones <https://en.wikipedia.org/wiki/List_of_tz_database_time_zones#List>`_.
     :param timeframe: The kline interval. e.g. "1m". see ``binance_history.constants.TIMEFRAMES``
         to see the full list of available intervals.
+    :param compact: If True, drop redundant columns and downcast the rest, see ``utils.compact_frame``.
+        Floats become float32, which is lossy beyond about 7 significant digits.
+    :param columns: If set, only these columns are returned. Cached files only read these
+        columns and the row groups overlapping ``[start, end)`` from disk.
+    :param max_workers: If set and ``use_async`` is False, download and parse this many files at a time
+        in a thread pool. Either way the files are downloaded through one pooled ``httpx.Client``.
     :return: A pandas dataframe with columns `open`, `high`, `low`, `close`, `volume`, `trades`, `close_datetime`.
         the dataframe's index is the open datetime of klines, the timezone of the datetime is set by ``tz``,
         if it is None, your local timezone will be used.
     """
-    if tz is None:
-        tz = tz.tzlocal().tzname(None)
+    tz = _resolve_tz(tz)
+    start, end = _resolve_range(start, end, tz)
+    symbol = _normalize_symbol(symbol)
 
-    start, end = unify_datetime(start), unify_datetime(end)
+    months, days = gen_dates(
+        data_type,
+        asset_type,
+        symbol,
+        start.tz_convert(None),
+        end.tz_convert(None),
+        timeframe=timeframe,
+    )
+    if use_async:
+        _install_event_loop()
+        df = asyncio.run(_gather(symbol=symbol, asset_type=asset_type, data_type=data_type, tz=tz, timeframe=timeframe, months=months, days=days, save_local=save_local, limit_rate=limit_rate, columns=columns, start=start, end=end))
+    else:
+        if data_type == "fundingRate":
+            days = []
+        files = [("monthly", dt) for dt in months] + [("daily", dt) for dt in days]
+        with _create_client(max_workers or 1) as client:
 
-    start, end = pd.Timestamp(start, tz=tz), pd.Timestamp(end, tz=tz)
+            def fetch_one(file):
+                freq, dt = file
+                return get_data(
+                    data_type, asset_type, freq, symbol, dt, tz, timeframe, save_local, columns, start, end,
+                    client,
+                )
 
-    symbol = symbol.upper().replace("/", "")
+            progress = dict(total=len(files), desc="Downloading data", unit="file")
+            if max_workers:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    dfs = list(tqdm(executor.map(fetch_one, files), **progress))
+            else:
+                dfs = [fetch_one(file) for file in tqdm(files, **progress)]
+        df = pd.concat(dfs)
+    df = df[(start <= df.index) & (df.index < end)]
+    if compact:
+        df = compact_frame(data_type, df)
+    return df
+
+def iter_data(
+    symbol: str,
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    data_type: Literal["klines", "aggTrades", "bookTicker", "fundingRate", "trades", "metrics"],
+    start: datetime,
+    end: datetime,
+    tz: Optional[str] = "UTC",
+    timeframe: Optional[str] = None,
+    save_local: Optional[bool] = False,
+    prefetch: int = 2,
+    chunksize: Optional[int] = None,
+    compact: bool = False,
+    columns: Optional[List[str]] = None,
+) -> Iterator[DataFrame]:
+    """
+    Iterate over the requested data file by file in chronological order instead of
+    concatenating everything into one dataframe, so huge ranges can be processed in constant memory.
+
+    :param prefetch: The number of files downloaded ahead of the one being consumed.
+    :param chunksize: If set, every file is further split into dataframes of at most ``chunksize`` rows.
+    :param compact: If True, drop redundant columns and downcast the rest like ``fetch_data``.
+    :param columns: If set, only these columns are read and returned, like ``fetch_data``.
+    :return: An iterator of dataframes already trimmed to ``[start, end)``.
+
+    The remaining parameters are the same as ``fetch_data``.
+    """
+    tz = _resolve_tz(tz)
+    start, end = _resolve_range(start, end, tz)
+    symbol = _normalize_symbol(symbol)
 
     months, days = gen_dates(
         data_type,
@@ -186,29 +272,266 @@ def fetch_data(
         end.tz_convert(None),
         timeframe=timeframe,
     )
-    if use_async:
-        if platform.system() == "linux" or platform.system() == "Darwin":
-            import uvloop
-            uvloop.install()
-        elif platform.system() == "Windows":
-            import winloop
-            winloop.install()
-        
-        df = asyncio.run(_gather(symbol=symbol, asset_type=asset_type, data_type=data_type, tz=tz, timeframe=timeframe, months=months, days=days, save_local=save_local, limit_rate=limit_rate))
-    else:
-        monthly_dfs = [
-            get_data(data_type, asset_type, "monthly", symbol, dt, tz, timeframe, save_local)
-            for dt in tqdm(months, desc="Downloading data", unit="month")
-        ]
-        if data_type != "fundingRate":
-            daily_dfs = [
-                get_data(data_type, asset_type, "daily", symbol, dt, tz, timeframe, save_local)
-                for dt in tqdm(days, desc="Downloading data", unit="day")
-            ]
-        else:
-            daily_dfs = []
-        df = pd.concat(monthly_dfs + daily_dfs)
-    return df[(start <= df.index) & (df.index < end)]
+    if data_type == "fundingRate":
+        days = []
+    files = sorted(
+        [(dt, "monthly") for dt in months] + [(dt, "daily") for dt in days]
+    )
+
+    executor = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+    client = _create_client(max(prefetch, 1))
+    pending = deque()
+    try:
+        for dt, freq in files:
+            pending.append(
+                executor.submit(
+                    get_data,
+                    data_type,
+                    asset_type,
+                    freq,
+                    symbol,
+                    dt,
+                    tz,
+                    timeframe,
+                    save_local,
+                    columns,
+                    start,
+                    end,
+                    client,
+                )
+            )
+            if len(pending) <= prefetch:
+                continue
+            yield from _iter_chunks(
+                data_type, pending.popleft().result(), start, end, chunksize, compact
+            )
+        while pending:
+            yield from _iter_chunks(
+                data_type, pending.popleft().result(), start, end, chunksize, compact
+            )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        client.close()
+
+
+def _iter_chunks(
+    data_type: str,
+    df: Optional[DataFrame],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    chunksize: Optional[int],
+    compact: bool,
+) -> Iterator[DataFrame]:
+    if df is None:
+        return
+    df = df[(start <= df.index) & (df.index < end)]
+    if df.empty:
+        return
+    if compact:
+        df = compact_frame(data_type, df)
+    if chunksize is None:
+        yield df
+        return
+    for i in range(0, len(df), chunksize):
+        yield df.iloc[i : i + chunksize]
+
+async def afetch_data(
+    symbol: str,
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    data_type: Literal["klines", "aggTrades", "bookTicker", "fundingRate", "trades", "metrics"],
+    start: datetime,
+    end: datetime,
+    tz: Optional[str] = "UTC",
+    timeframe: Optional[str] = None,
+    save_local: Optional[bool] = False,
+    limit_rate: Optional[float] = None,
+    compact: bool = False,
+    columns: Optional[List[str]] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """
+    The coroutine version of ``fetch_data``. It runs on the current event loop instead of starting
+    its own, so it works inside Jupyter or an async service, and many calls can be gathered.
+
+    :param session: The ``aiohttp`` session to download with, e.g. one shared by many calls.
+        By default a session is opened and closed by the call.
+    :param limiter: The ``throttle.AdaptiveLimiter`` (or ``asynciolimiter.Limiter``) to pass every
+        request through. Share one between calls to adapt them to throttling together.
+        By default a limiter of ``config.MAX_CONNECTIONS`` requests and ``limit_rate`` is created.
+
+    The remaining parameters are the same as ``fetch_data``.
+    """
+    tz = _resolve_tz(tz)
+    start, end = _resolve_range(start, end, tz)
+    symbol = _normalize_symbol(symbol)
+
+    # planning may list the bucket with blocking requests
+    months, days = await asyncio.to_thread(
+        gen_dates,
+        data_type,
+        asset_type,
+        symbol,
+        start.tz_convert(None),
+        end.tz_convert(None),
+        timeframe=timeframe,
+    )
+    df = await _gather(
+        symbol=symbol, asset_type=asset_type, data_type=data_type, tz=tz, timeframe=timeframe,
+        months=months, days=days, limit_rate=limit_rate, save_local=save_local, columns=columns,
+        start=start, end=end, session=session, limiter=limiter,
+    )
+    df = df[(start <= df.index) & (df.index < end)]
+    if compact:
+        df = compact_frame(data_type, df)
+    return df
+
+
+async def afetch_klines(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    timeframe: str = "1m",
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="klines",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        timeframe=timeframe,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
+
+async def afetch_trades(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="trades",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
+
+async def afetch_agg_trades(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="aggTrades",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
+
+async def afetch_book_ticker(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="bookTicker",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
+
+async def afetch_funding_rate(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="fundingRate",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
+
+async def afetch_metrics(
+    symbol: str,
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    tz: Optional[str] = None,
+    compact: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> DataFrame:
+    """convenience coroutine awaiting ``afetch_data``"""
+
+    return await afetch_data(
+        data_type="metrics",
+        asset_type=asset_type,
+        symbol=symbol,
+        start=start,
+        end=end,
+        tz=tz,
+        compact=compact,
+        session=session,
+        limiter=limiter,
+    )
 
 async def _gather(
     symbol: str,
@@ -220,63 +543,582 @@ async def _gather(
     days: List[datetime] = [],
     limit_rate: float = None, # 3 requests per second
     save_local: Optional[bool] = False,
+    columns: Optional[List[str]] = None,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
 ):
-    headers = {
-        "Content-Type": "application/json;charset=UTF-8",
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
-    }
-    
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    if limit_rate is not None:
-        limiter = asynciolimiter.Limiter(rate=limit_rate)
-    else:
-        limiter = None
-    session = aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=ssl_context))
+    if limiter is None:
+        limiter = _create_limiter(limit_rate, config.MAX_CONNECTIONS)
+    own_session = session is None
+    if own_session:
+        session = _create_session(config.MAX_CONNECTIONS)
     try:
         monthly_dfs = [
-            get_data_async(data_type, asset_type, "monthly", symbol, dt, tz, timeframe, save_local, session, limiter)
+            get_data_async(data_type, asset_type, "monthly", symbol, dt, tz, timeframe, save_local, session, limiter, columns, start, end)
             for dt in months
         ]
         if data_type != "fundingRate":
             daily_dfs = [
-                get_data_async(data_type, asset_type, "daily", symbol, dt, tz, timeframe, save_local, session, limiter)
+                get_data_async(data_type, asset_type, "daily", symbol, dt, tz, timeframe, save_local, session, limiter, columns, start, end)
                 for dt in days
             ]
         else:
             daily_dfs = []
         dfs = await tqdm.gather(*monthly_dfs, *daily_dfs)
         df = pd.concat(dfs)
-        return df    
-    except asyncio.CancelledError:
-        print("Cancelled")
+        return df
+    finally:
+        if own_session:
+            await session.close()
+
+def fetch_many(
+    symbols: List[str],
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    data_type: Literal["klines", "aggTrades", "bookTicker", "fundingRate", "trades", "metrics"],
+    start: Union[str, datetime, Mapping[str, Union[str, datetime]]],
+    end: Union[str, datetime, Mapping[str, Union[str, datetime]]],
+    tz: Optional[str] = "UTC",
+    timeframe: Optional[str] = None,
+    save_local: Optional[bool] = False,
+    limit_rate: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    as_frame: bool = False,
+    compact: bool = False,
+    columns: Optional[List[str]] = None,
+) -> Union[Dict[str, DataFrame], DataFrame]:
+    """
+    Fetch the same data type for many symbols as a single job. Every monthly/daily file of every
+    symbol is scheduled on one event loop and downloaded through one pooled ``aiohttp`` session.
+
+    :param symbols: The binance market pair names. e.g. ``['BTCUSDT', 'ETHUSDT']``.
+    :param start: The start datetime of requested data, either shared by all symbols or a mapping
+        of symbol to start datetime, e.g. ``{s: i.availableSince for s, i in fetch_all_symbols().items()}``.
+    :param end: The end datetime of requested data, shared or per symbol like ``start``.
+    :param limit_rate: The maximum number of downloads started per second. Either way the number of
+        downloads in flight and their rate adapt to throttling and latency, see ``throttle.AdaptiveLimiter``.
+    :param max_concurrency: The maximum number of files downloaded at the same time across all symbols.
+        Default is ``config.MAX_CONNECTIONS``.
+    :param as_frame: If True, return one long-format dataframe with a ``symbol`` column instead of a dict.
+    :param compact: If True, drop redundant columns and downcast the rest like ``fetch_data``.
+    :param columns: If set, only these columns are read and returned, like ``fetch_data``.
+    :return: A dict of symbol to dataframe, symbols without any data are left out with a warning.
+
+    The remaining parameters are the same as ``fetch_data``.
+    """
+    tz = _resolve_tz(tz)
+    if max_concurrency is None:
+        max_concurrency = config.MAX_CONNECTIONS
+
+    def plan(symbol):
+        key = _normalize_symbol(symbol)
+        sym_start, sym_end = _resolve_range(
+            _pick(start, symbol), _pick(end, symbol), tz
+        )
+        months, days = gen_dates(
+            data_type,
+            asset_type,
+            key,
+            sym_start.tz_convert(None),
+            sym_end.tz_convert(None),
+            timeframe=timeframe,
+        )
+        if data_type == "fundingRate":
+            days = []
+        return key, (sym_start, sym_end, months, days)
+
+    # probing what each symbol has is network bound, so it's done in parallel
+    with ThreadPoolExecutor(max_workers=config.PROBE_WORKERS) as executor:
+        plans = dict(executor.map(plan, symbols))
+
+    _install_event_loop()
+    dfs = asyncio.run(
+        _gather_many(
+            plans=plans,
+            asset_type=asset_type,
+            data_type=data_type,
+            tz=tz,
+            timeframe=timeframe,
+            save_local=save_local,
+            limit_rate=limit_rate,
+            max_concurrency=max_concurrency,
+            columns=columns,
+        )
+    )
+
+    if compact:
+        dfs = {s: compact_frame(data_type, df) for s, df in dfs.items()}
+    if as_frame:
+        if not dfs:
+            return DataFrame()
+        df = pd.concat([df.assign(symbol=s) for s, df in dfs.items()])
+        if compact:
+            df["symbol"] = df["symbol"].astype("category")
+        return df
+    return dfs
+
+
+async def _gather_many(
+    plans: Dict[str, tuple],
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    data_type: str,
+    tz: Optional[str] = None,
+    timeframe: Optional[str] = None,
+    save_local: Optional[bool] = False,
+    limit_rate: float = None,
+    max_concurrency: int = 32,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, DataFrame]:
+    limiter = _create_limiter(limit_rate, max_concurrency)
+    session = _create_session(limit=max_concurrency)
+
+    async def fetch_one(symbol, freq, dt):
+        start, end = plans[symbol][:2]
+        return symbol, await get_data_async(
+            data_type, asset_type, freq, symbol, dt, tz, timeframe, save_local, session, limiter,
+            columns, start, end,
+        )
+
+    try:
+        tasks = [
+            fetch_one(symbol, freq, dt)
+            for symbol, (_, _, months, days) in plans.items()
+            for freq, dts in (("monthly", months), ("daily", days))
+            for dt in dts
+        ]
+        results = await tqdm.gather(*tasks, desc="Downloading data", unit="file")
     finally:
         await session.close()
 
-def fetch_all_symbols(asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot") -> Dict[str, Symbol]:
-    
-    exchange_map = {
-        "spot": "binance",
-        "futures/um": "binance-futures",
-        "futures/cm": "binance-delivery",
-        
+    frames: Dict[str, List[DataFrame]] = {symbol: [] for symbol in plans}
+    for symbol, df in results:
+        if df is not None:
+            frames[symbol].append(df)
+
+    dfs = {}
+    for symbol, (start, end, _, _) in plans.items():
+        if not frames[symbol]:
+            warnings.warn(f"No data found for {symbol}")
+            continue
+        df = pd.concat(frames[symbol])
+        dfs[symbol] = df[(start <= df.index) & (df.index < end)]
+    return dfs
+
+
+def fetch_panel(
+    symbols: List[str],
+    start: Union[str, datetime],
+    end: Union[str, datetime],
+    field: str = "close",
+    timeframe: str = "1m",
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    tz: Optional[str] = "UTC",
+    save_local: Optional[bool] = False,
+    limit_rate: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    dtype: str = "float64",
+) -> DataFrame:
+    """
+    Fetch one kline field of many symbols as a wide dataframe, indexed by the open times of
+    ``timeframe`` in ``[start, end)`` with one column per symbol. The values of every file are
+    written into a preallocated time x symbol array as soon as the file is loaded, so no
+    long-format frame of all symbols is ever built. Klines missing from the data are NaN.
+
+    Unlike looping over ``fetch_data``, the panel is fetched as a whole: if any file fails to
+    download the error is raised and no panel is returned. With ``save_local`` the files already
+    downloaded stay cached, so calling it again only fetches the rest.
+
+    :param field: The kline column to collect, e.g. "close" or "volume".
+    :param dtype: The dtype of the panel, a float dtype so missing klines can be NaN.
+
+    The remaining parameters are the same as ``fetch_many``.
+    """
+    tz = _resolve_tz(tz)
+    if max_concurrency is None:
+        max_concurrency = config.MAX_CONNECTIONS
+    start, end = _resolve_range(start, end, tz)
+    index = _kline_grid(timeframe, start, end).tz_convert(tz)
+    keys = list(dict.fromkeys(_normalize_symbol(symbol) for symbol in symbols))
+    panel = np.full((len(index), len(keys)), np.nan, dtype=dtype)
+
+    def plan(col, key):
+        months, days = gen_dates(
+            "klines", asset_type, key, start.tz_convert(None), end.tz_convert(None), timeframe=timeframe
+        )
+        return [(col, key, freq, dt) for freq, dts in (("monthly", months), ("daily", days)) for dt in dts]
+
+    with ThreadPoolExecutor(max_workers=config.PROBE_WORKERS) as executor:
+        files = [file for fs in executor.map(plan, range(len(keys)), keys) for file in fs]
+
+    _install_event_loop()
+    found = asyncio.run(
+        _fill_panel(
+            panel, index, files, field, asset_type, start, end, tz, timeframe, save_local,
+            limit_rate, max_concurrency,
+        )
+    )
+    for col, key in enumerate(keys):
+        if col not in found:
+            warnings.warn(f"No data found for {key}")
+    return DataFrame(panel, index=index.rename("datetime"), columns=keys, copy=False)
+
+
+def _kline_grid(timeframe: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DatetimeIndex:
+    """The UTC open times of the klines of ``timeframe`` in ``[start, end)``."""
+    freq = KLINE_FREQS[timeframe]
+    start, end = start.tz_convert("UTC"), end.tz_convert("UTC")
+    if freq in ("W-MON", "MS"):
+        # anchored frequencies roll the start forward to the next open time
+        return pd.date_range(start.ceil("D"), end, freq=freq, inclusive="left")
+    return pd.date_range(start.ceil(freq), end, freq=freq, inclusive="left")
+
+
+async def _fill_panel(
+    panel: np.ndarray,
+    index: pd.DatetimeIndex,
+    files: List[tuple],
+    field: str,
+    asset_type: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    tz: str,
+    timeframe: str,
+    save_local: Optional[bool],
+    limit_rate: Optional[float],
+    max_concurrency: int,
+) -> set:
+    """Write ``field`` of every file into its column of ``panel``, returning the columns written to."""
+    limiter = _create_limiter(limit_rate, max_concurrency)
+    session = _create_session(limit=max_concurrency)
+    found = set()
+
+    async def fill_one(col, symbol, freq, dt):
+        df = await get_data_async(
+            "klines", asset_type, freq, symbol, dt, tz, timeframe, save_local, session, limiter,
+            [field], start, end,
+        )
+        if df is None:
+            return
+        rows = index.get_indexer(df.index)
+        mask = rows >= 0
+        panel[rows[mask], col] = df[field].to_numpy()[mask]
+        found.add(col)
+
+    try:
+        await tqdm.gather(*[fill_one(*file) for file in files], desc="Downloading data", unit="file")
+    finally:
+        await session.close()
+    return found
+
+
+def sync(
+    symbol: str,
+    data_type: Literal["klines", "aggTrades", "bookTicker", "fundingRate", "trades", "metrics"],
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    timeframe: Optional[str] = None,
+    start: Union[str, datetime, None] = None,
+    end: Union[str, datetime, None] = None,
+    limit_rate: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+) -> List[str]:
+    """
+    Bring the cache of a symbol up to date. Only the files after the end of its latest cached
+    file, the high-water mark of the cache manifest, are planned, and only those not cached yet
+    are downloaded and saved like with ``save_local=True``. Nothing is returned in memory, read
+    the data with ``fetch_data`` or ``read_store`` afterwards.
+
+    :param start: Where to start when nothing is cached for the symbol yet, ignored otherwise.
+    :param end: Where to stop. Default is the start of the current UTC day, the end of the latest
+        daily file Binance may have published.
+    :return: The urls of the files cached by this call.
+
+    The remaining parameters are the same as ``fetch_many``.
+    """
+    _, files = _plan_sync(_normalize_symbol(symbol), asset_type, data_type, timeframe, start, end)
+    if not files:
+        return []
+    _install_event_loop()
+    outcomes = asyncio.run(
+        _sync_files(
+            files, asset_type, timeframe, limit_rate, max_concurrency or config.MAX_CONNECTIONS
+        )
+    )
+    for _, _, error in outcomes:
+        if error is not None:
+            raise error
+    return [url for _, url, _ in outcomes if url is not None]
+
+
+def sync_universe(
+    asset_type: Literal["spot", "futures/um", "futures/cm"],
+    data_types: Union[str, List[str]],
+    timeframe: Optional[str] = None,
+    symbol_type: Optional[SymbolType] = None,
+    active: Optional[bool] = None,
+    where: Optional[Callable[[Symbol], bool]] = None,
+    start: Union[str, datetime, None] = None,
+    end: Union[str, datetime, None] = None,
+    limit_rate: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    source: Literal["tardis", "bucket"] = "tardis",
+) -> DataFrame:
+    """
+    ``sync`` every symbol of an exchange as one job. The symbols of ``fetch_all_symbols`` are
+    filtered, the missing files of every symbol and data type are planned at once, clamped to the
+    availability of the symbol, and downloaded through one pooled session and adaptive limiter
+    with a single progress bar.
+
+    :param data_types: The data types to sync, e.g. ``["klines", "fundingRate"]``.
+    :param symbol_type: Only sync symbols of this type, e.g. ``SymbolType.PERP``.
+    :param active: Only sync symbols still (True) or no longer (False) traded.
+    :param where: Only sync the symbols for which this returns True.
+    :param start: Where to start symbols without cached data, or when the symbol was listed if later.
+        Default is when the symbol was listed.
+    :param end: Where to stop. Default is the start of the current UTC day, or the day after
+        the symbol was delisted.
+    :param source: The source of ``fetch_all_symbols``. "bucket" clamps every symbol to the
+        files that exist.
+    :return: A dataframe with one row per symbol and data type, with the ``start`` and ``end`` of the
+        planned range (``start`` is the high-water mark when something is cached), the number of
+        ``planned``, ``cached``, ``not_found`` and ``failed`` files, and the ``error`` that stopped
+        planning or of the last file that failed to download or parse.
+
+    The remaining parameters are the same as ``fetch_many``.
+    """
+    if isinstance(data_types, str):
+        data_types = [data_types]
+    symbols = {
+        _normalize_symbol(s): i
+        for s, i in fetch_all_symbols(asset_type, source=source).items()
+        if (symbol_type is None or i.type == symbol_type)
+        and (active is None or i.active == active)
+        and (where is None or where(i))
     }
-    
-    info = {}
-    
-    res = get_exchange_details(exchange = exchange_map[asset_type])
-    symbols = res['datasets']['symbols']
-    
-    for s in symbols:
-        if s["id"] not in ["FUTURES", "PERPETUALS", "SPOT"]:
-            info[s['id']] = Symbol(
-                id = s['id'],
-                type = SymbolType(s['type']),
-                availableSince=pd.to_datetime(s['availableSince'], utc=True),
-                availableTo=pd.to_datetime(s['availableTo'], utc=True),
+    end = (
+        pd.Timestamp.now(tz="UTC").normalize()
+        if end is None
+        else pd.Timestamp(unify_datetime(end), tz="UTC")
+    )
+
+    def plan(symbol, data_type):
+        info = symbols[symbol]
+        sym_start = info.availableSince
+        if start is not None:
+            sym_start = max(sym_start, pd.Timestamp(unify_datetime(start), tz="UTC"))
+        sym_end = min(end, info.availableTo.ceil("D"))
+        report = dict(
+            symbol=symbol, data_type=data_type, start=sym_start, end=sym_end,
+            planned=0, cached=0, not_found=0, failed=0, error=None,
+        )
+        try:
+            report["start"], files = _plan_sync(symbol, asset_type, data_type, timeframe, sym_start, sym_end)
+        except (NetworkError, ValueError) as e:
+            report["error"] = str(e)
+            files = []
+        report["planned"] = len(files)
+        return report, files
+
+    jobs = [(symbol, data_type) for symbol in symbols for data_type in data_types]
+    with ThreadPoolExecutor(max_workers=config.PROBE_WORKERS) as executor:
+        plans = list(
+            tqdm(
+                executor.map(lambda job: plan(*job), jobs),
+                total=len(jobs), desc="Planning", unit="symbol",
             )
-    
-    return info
-    
+        )
+
+    reports = {(r["symbol"], r["data_type"]): r for r, _ in plans}
+    files = [file for _, fs in plans for file in fs]
+    if files:
+        _install_event_loop()
+        outcomes = asyncio.run(
+            _sync_files(
+                files, asset_type, timeframe, limit_rate, max_concurrency or config.MAX_CONNECTIONS
+            )
+        )
+        for (data_type, symbol, _, _), url, error in outcomes:
+            report = reports[(symbol, data_type)]
+            if error is not None:
+                report["failed"] += 1
+                report["error"] = str(error)
+            elif url is None:
+                report["not_found"] += 1
+            else:
+                report["cached"] += 1
+
+    return DataFrame(
+        [r for r, _ in plans],
+        columns=["symbol", "data_type", "start", "end", "planned", "cached", "not_found", "failed", "error"],
+    )
+
+
+def _plan_sync(
+    symbol: str,
+    asset_type: str,
+    data_type: str,
+    timeframe: Optional[str],
+    start: Union[str, datetime, None],
+    end: Union[str, datetime, None],
+) -> Tuple[pd.Timestamp, List[tuple]]:
+    """
+    Where the sync starts, the high-water mark if anything is cached, and the
+    ``(data_type, symbol, freq, dt)`` of the files missing from there.
+    """
+    high_water = high_water_mark(
+        asset_type, data_type, symbol, timeframe if data_type == "klines" else None
+    )
+    if high_water is not None:
+        start = high_water
+    elif start is not None:
+        start = pd.Timestamp(unify_datetime(start), tz="UTC")
+    else:
+        raise ValueError(f"Nothing is cached for {symbol} {data_type} yet, a start is needed")
+    if end is None:
+        end = pd.Timestamp.now(tz="UTC").normalize()
+    else:
+        end = pd.Timestamp(unify_datetime(end), tz="UTC")
+    if start >= end:
+        return start, []
+
+    months, days = gen_dates(
+        data_type, asset_type, symbol, start.tz_convert(None), end.tz_convert(None), timeframe=timeframe
+    )
+    if data_type == "fundingRate":
+        days = []
+    files = {
+        gen_data_url(data_type, asset_type, freq, symbol, dt, timeframe): (data_type, symbol, freq, dt)
+        for freq, dts in (("monthly", months), ("daily", days))
+        for dt in dts
+    }
+    cached = lookup_files(files)
+    return start, [file for url, file in files.items() if url not in cached]
+
+
+async def _sync_files(
+    files: List[tuple],
+    asset_type: str,
+    timeframe: Optional[str],
+    limit_rate: Optional[float],
+    max_concurrency: int,
+) -> List[tuple]:
+    """Cache ``files``, returning for each file its url if it was found and the error if it failed."""
+    limiter = _create_limiter(limit_rate, max_concurrency)
+    session = _create_session(limit=max_concurrency)
+
+    async def sync_one(file):
+        data_type, symbol, freq, dt = file
+        try:
+            df = await get_data_async(
+                data_type, asset_type, freq, symbol, dt, "UTC", timeframe, True, session, limiter
+            )
+        except (NetworkError, zipfile.BadZipFile, ValueError, pa.ArrowException) as e:
+            return file, None, e
+        if df is None:
+            return file, None, None
+        return file, gen_data_url(data_type, asset_type, freq, symbol, dt, timeframe), None
+
+    try:
+        return await tqdm.gather(*[sync_one(file) for file in files], desc="Syncing data", unit="file")
+    finally:
+        await session.close()
+
+
+def _resolve_tz(tz: Optional[str]) -> str:
+    if tz is None:
+        tz = dateutil_tz.tzlocal().tzname(None)
+    return tz
+
+
+def _resolve_range(
+    start: Union[str, datetime], end: Union[str, datetime], tz: str
+) -> tuple:
+    start, end = unify_datetime(start), unify_datetime(end)
+    return pd.Timestamp(start, tz=tz), pd.Timestamp(end, tz=tz)
+
+
+def _normalize_symbol(symbol: str) -> str:
+    return symbol.upper().replace("/", "")
+
+
+def _pick(value, symbol: str):
+    if isinstance(value, Mapping):
+        return value[symbol]
+    return value
+
+
+def _install_event_loop():
+    if platform.system() == "Linux" or platform.system() == "Darwin":
+        import uvloop
+        uvloop.install()
+    elif platform.system() == "Windows":
+        import winloop
+        winloop.install()
+
+
+def _create_limiter(limit_rate: Optional[float], max_concurrency: int) -> AdaptiveLimiter:
+    return AdaptiveLimiter(max_concurrency=max_concurrency, max_rate=limit_rate)
+
+
+HEADERS = {
+    "Content-Type": "application/json;charset=UTF-8",
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
+}
+
+
+def _create_client(limit: int = 1) -> httpx.Client:
+    """A client keeping ``limit`` connections alive, so files after the first skip the TLS handshake."""
+    return httpx.Client(
+        headers=HEADERS,
+        verify=certifi.where(),
+        limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+    )
+
+
+def _create_session(limit: int = 100) -> aiohttp.ClientSession:
+    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return aiohttp.ClientSession(
+        headers=HEADERS,
+        connector=aiohttp.TCPConnector(ssl=ssl_context, limit=limit, limit_per_host=limit),
+    )
+
+def fetch_all_symbols(
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    refresh: bool = False,
+    source: Literal["tardis", "bucket"] = "tardis",
+) -> Dict[str, Symbol]:
+    """
+    Fetch all trading pairs of an asset type. They are cached under
+    ``config.CACHE_DIR / 'symbols'`` for ``config.SYMBOLS_TTL`` seconds, and served from
+    there when the source can't be reached.
+
+    :param refresh: Fetch the trading pairs even if the cached ones are fresh.
+    :param source: "tardis" for the exchange details of tardis.dev, or "bucket" to list the
+        symbols of data.binance.vision, available from their first daily kline to the end of
+        their last one.
+    """
+    table = get_symbol_table(asset_type, refresh, source)
+    return {
+        id: Symbol(id=id, type=SymbolType(type), availableSince=since, availableTo=to)
+        for id, type, since, to in zip(
+            table.index, table["type"], table["availableSince"], table["availableTo"]
+        )
+    }
+
+
+def fetch_symbol_table(
+    asset_type: Literal["spot", "futures/um", "futures/cm"] = "spot",
+    refresh: bool = False,
+    source: Literal["tardis", "bucket"] = "tardis",
+) -> DataFrame:
+    """
+    ``fetch_all_symbols`` as a dataframe indexed by id, with the ``type``, ``availableSince``,
+    ``availableTo`` and ``active`` columns, to filter the trading pairs without a loop.
+    """
+    table = get_symbol_table(asset_type, refresh, source).copy()
+    table["active"] = table["availableTo"] >= pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=1)
+    return table
+
     # exchange.load_markets()
     # spot, futures_um, futures_cm = [], [], []
     # for symbol, data in exchange.markets.items():
@@ -0,0 +1,157 @@
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pandas import Timestamp
+
+from . import config
+from .exceptions import DataNotFound
+from .manifest import (
+    evict,
+    forget_files,
+    lookup_file,
+    read_stats,
+    record_file,
+    record_promotion,
+)
+from .memory import memory_cache
+from .store import (
+    DataFile,
+    landing_url,
+    monthly_url,
+    parse_data_url,
+    read_parquet,
+    read_sources,
+    to_store_frame,
+    write_partition,
+)
+from .utils import download_data, get_local_data_path, probe_months, save_data_to_disk
+
+
+def _matches(
+    file: DataFile,
+    symbol: Optional[str],
+    asset_type: Optional[str],
+    data_type: Optional[str],
+) -> bool:
+    return (
+        (symbol is None or file.symbol == symbol.upper().replace("/", ""))
+        and (asset_type is None or file.asset_type == asset_type)
+        and (data_type is None or file.data_type == data_type)
+    )
+
+
+def promote_daily_files(
+    symbol: Optional[str] = None,
+    asset_type: Optional[str] = None,
+    data_type: Optional[str] = None,
+) -> List[str]:
+    """
+    Replace the cached daily files of past months by the monthly file of that month once
+    Binance has published it, and record every swap in the cache manifest. Both per-zip
+    parquet files and compacted store partitions are promoted.
+
+    :param symbol: Only promote files of this symbol. Default is all symbols.
+    :param asset_type: Only promote files of this asset type. Default is all asset types.
+    :param data_type: Only promote files of this data type. Default is all data types.
+    :return: The urls of the monthly files swapped in.
+    """
+    now = Timestamp.now(tz="UTC")
+    current_month = Timestamp(now.year, now.month, 1)
+
+    # monthly url -> daily urls it replaces, with their per-zip parquet if any
+    groups: Dict[str, Dict[str, Optional[Path]]] = {}
+    partitions: Dict[str, Path] = {}
+
+    for path in sorted((config.CACHE_DIR / "data").rglob("*.parquet")):
+        url = landing_url(path)
+        file = parse_data_url(url)
+        if file.freq != "daily" or file.month >= current_month:
+            continue
+        if _matches(file, symbol, asset_type, data_type):
+            groups.setdefault(monthly_url(url), {})[url] = path
+
+    for path in sorted((config.CACHE_DIR / "store").rglob("data.parquet")):
+        sources = read_sources(path)
+        daily_urls = [url for url in sources if "/daily/" in url]
+        if not daily_urls:
+            continue
+        url = monthly_url(daily_urls[0])
+        file = parse_data_url(url)
+        if url in sources or file.month >= current_month:
+            continue
+        if _matches(file, symbol, asset_type, data_type):
+            partitions[url] = path
+            for daily_url in daily_urls:
+                groups.setdefault(url, {}).setdefault(daily_url, None)
+
+    if not groups:
+        return []
+
+    available = probe_months(list(groups))
+    promoted = []
+    for url, daily_files in groups.items():
+        if not available[url]:
+            continue
+
+        file = parse_data_url(url)
+        landing = get_local_data_path(url)
+        try:
+            if url in partitions:
+                if landing.exists():
+                    df = read_parquet(landing, file.data_type)
+                    record = lookup_file(url)
+                    checksum = record.checksum if record else None
+                else:
+                    df = download_data(file.data_type, "UTC", url)
+                    checksum = df.attrs.get("checksum")
+                write_partition(partitions[url], to_store_frame(file.data_type, df), {url})
+                record_file(url, partitions[url], len(df), checksum)
+                landing.unlink(missing_ok=True)
+            elif not landing.exists():
+                df = download_data(file.data_type, "UTC", url)
+                save_data_to_disk(url, df, save_local=True)
+        except DataNotFound:
+            warnings.warn(f"Data not found: {url}")
+            continue
+
+        for path in daily_files.values():
+            if path is not None:
+                path.unlink(missing_ok=True)
+        forget_files(daily_files)
+        record_promotion(url, list(daily_files))
+        promoted.append(url)
+
+    return promoted
+
+
+def evict_cache(max_bytes: Optional[int] = None) -> List[Path]:
+    """
+    Delete the least recently read cached files until the cache holds at most ``max_bytes``.
+    Files matching ``config.CACHE_PINNED`` are kept.
+
+    :param max_bytes: The size to shrink the cache to. Default is ``config.CACHE_MAX_BYTES``.
+    :return: The deleted files.
+    """
+    if max_bytes is None:
+        max_bytes = config.CACHE_MAX_BYTES
+    if max_bytes is None:
+        return []
+    return evict(max_bytes)
+
+
+def cache_stats() -> Dict[str, float]:
+    """
+    Report the use of the cache under ``config.CACHE_DIR`` since it was created.
+
+    :return: A dict with the number of ``hits`` and ``misses`` of cached reads, the ``hit_rate``,
+        the number of cached ``files`` and their ``bytes``, ``max_bytes``, and the number of
+        ``evictions`` and ``evicted_bytes``. ``memory`` holds the ``hits``, ``misses``, ``files``
+        and ``bytes`` of the memory cache of this process.
+    """
+    stats = read_stats()
+    reads = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / reads if reads else 0.0
+    stats["max_bytes"] = config.CACHE_MAX_BYTES
+    stats["memory"] = memory_cache.stats()
+    return stats
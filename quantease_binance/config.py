@@ -4,6 +4,88 @@ import os
 # Default cache directory
 CACHE_DIR = Path.cwd() / ".cache"
 
+# Base url of the data files, the urls recorded in the cache manifest start with it
+DATA_URL = "https://data.binance.vision"
+
+# S3 endpoint serving the listings of data.binance.vision
+LISTING_URL = "https://s3-ap-northeast-1.amazonaws.com/data.binance.vision"
+
+# Seconds a bucket listing cached under CACHE_DIR is considered fresh
+LISTING_TTL = 6 * 60 * 60
+
+# Seconds a download may receive nothing before it is retried, the transfer
+# resumes from the bytes kept under CACHE_DIR / "partial"
+DOWNLOAD_STALL_TIMEOUT = 30
+
+# Check downloads against the sha256 Binance publishes in ``<url>.CHECKSUM``
+VERIFY_CHECKSUM = True
+
+# Bytes read from the network at a time while downloading
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Csv parser of the downloaded files, "pyarrow" (multithreaded) or "pandas"
+CSV_ENGINE = "pyarrow"
+
+# Bytes of csv the pyarrow engine decompresses and parses at a time. Downloads
+# are spooled to disk and parsed block by block, so this rather than the size of
+# the archive bounds the csv text in memory, next to the parsed frame itself
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Rows per row group of the compacted parquet store, smaller groups make
+# time range reads skip more data at the cost of larger footers
+STORE_ROW_GROUP_SIZE = 128 * 1024
+
+# Number of threads used to probe which monthly files exist
+PROBE_WORKERS = 16
+
+# Seconds before a cached "file does not exist" answer is checked again,
+# monthly files of the latest month are published a few days after it ends
+PROBE_NEGATIVE_TTL = 6 * 60 * 60
+
+# Seconds the symbols of fetch_all_symbols cached under CACHE_DIR are
+# considered fresh, stale symbols are still used when tardis.dev is unreachable
+SYMBOLS_TTL = 24 * 60 * 60
+
+# Bytes of cached data files kept under CACHE_DIR, the least recently read
+# files are deleted beyond it. None means unbounded
+CACHE_MAX_BYTES = None
+
+# (symbol, data_type) pairs whose cached files are never evicted, None matches
+# any value, e.g. [("BTCUSDT", None), (None, "fundingRate")]
+CACHE_PINNED = []
+
+# Bytes of parsed files kept in memory by url, so repeated fetches of the same
+# range skip the disk cache. 0 disables the memory cache
+MEMORY_CACHE_BYTES = 0
+
+# Keep the downloaded zips under CACHE_DIR / "raw", named by their sha256, so
+# parsing them again with another time zone, engine or columns needs no
+# download. Raw zips are not counted by CACHE_MAX_BYTES
+SAVE_RAW = False
+
+# Connections of the aiohttp session, and default maximum number of downloads
+# in flight of the async functions
+MAX_CONNECTIONS = 32
+
+# The async downloads back off when the time to first byte exceeds this many
+# times the fastest one seen
+THROTTLE_LATENCY_FACTOR = 4
+
+# Seconds after a back off during which further errors don't back off again
+THROTTLE_COOLDOWN = 1.0
+
+# Pool the async functions decode downloads in, "thread", "process" or None
+# to decode on the event loop. pyarrow csv parsing releases the GIL, so
+# threads usually suffice, processes help the "pandas" CSV_ENGINE
+DECODE_EXECUTOR = "thread"
+
+# Workers of the decode pool, None for the number of CPUs
+DECODE_WORKERS = None
+
+# Files being downloaded or waiting to be decoded at any time, downloads wait
+# for a free place, so a slow decode stage slows the downloads down
+DECODE_QUEUE_SIZE = 64
+
 
 def set_cache_dir(path: str):
     """Set the cache directory."""
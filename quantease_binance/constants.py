@@ -16,3 +16,105 @@ TIMEFRAMES = [
     "1w",
     "1M",
 ]
+
+# pandas frequency of the open times of each kline interval, weekly klines
+# open on Mondays and monthly ones on the first of the month
+KLINE_FREQS = {
+    "1s": "1s",
+    "1m": "1min",
+    "3m": "3min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "1h",
+    "2h": "2h",
+    "4h": "4h",
+    "6h": "6h",
+    "8h": "8h",
+    "12h": "12h",
+    "1d": "1D",
+    "3d": "3D",
+    "1w": "W-MON",
+    "1M": "MS",
+}
+
+# Columns and dtypes of the csv files inside the zips of each data type,
+# files may carry trailing columns that are not listed here
+CSV_SCHEMAS = {
+    "klines": [
+        ("open_time", "int64"),
+        ("open", "float64"),
+        ("high", "float64"),
+        ("low", "float64"),
+        ("close", "float64"),
+        ("volume", "float64"),
+        ("close_time", "int64"),
+        ("quote_volume", "float64"),
+        ("count", "int64"),
+        ("taker_buy_volume", "float64"),
+        ("taker_buy_quote_volume", "float64"),
+        ("ignore", "float64"),
+    ],
+    "aggTrades": [
+        ("agg_trade_id", "int64"),
+        ("price", "float64"),
+        ("quantity", "float64"),
+        ("first_trade_id", "int64"),
+        ("last_trade_id", "int64"),
+        ("transact_time", "int64"),
+        ("is_buyer_maker", "bool"),
+    ],
+    "bookTicker": [
+        ("update_id", "int64"),
+        ("bid_price", "float64"),
+        ("bid_quantity", "float64"),
+        ("ask_price", "float64"),
+        ("ask_quantity", "float64"),
+        ("transaction_time", "int64"),
+        ("event_time", "int64"),
+    ],
+    "fundingRate": [
+        ("calc_time", "int64"),
+        ("funding_interval_hours", "int64"),
+        ("last_funding_rate", "float64"),
+    ],
+    "trades": [
+        ("id", "int64"),
+        ("price", "float64"),
+        ("qty", "float64"),
+        ("base_qty", "float64"),
+        ("time", "int64"),
+        ("is_buyer_maker", "bool"),
+    ],
+    "metrics": [
+        ("create_time", "string"),
+        ("symbol", "string"),
+        ("sum_open_interest", "float64"),
+        ("sum_open_interest_value", "float64"),
+        ("count_toptrader_long_short_ratio", "float64"),
+        ("sum_toptrader_long_short_ratio", "float64"),
+        ("count_long_short_ratio", "float64"),
+        ("sum_taker_long_short_vol_ratio", "float64"),
+    ],
+}
+
+# Column the datetime index is built from, in epoch milliseconds unless noted
+TIME_COLUMNS = {
+    "klines": "open_time",
+    "aggTrades": "transact_time",
+    "bookTicker": "event_time",
+    "fundingRate": "calc_time",
+    "trades": "time",
+    "metrics": "create_time",  # "2024-07-01 00:05:00" strings
+}
+
+# Columns dropped by ``compact=True``, they duplicate the datetime index or carry no data.
+# bookTicker keeps transaction_time since it differs from the event_time index
+REDUNDANT_COLUMNS = {
+    "klines": ["open_time", "close_time", "ignore"],
+    "aggTrades": ["transact_time"],
+    "bookTicker": ["event_time"],
+    "fundingRate": ["calc_time"],
+    "trades": ["time"],
+    "metrics": ["create_time"],
+}
@@ -4,3 +4,15 @@ class NetworkError(Exception):
 
 class DataNotFound(Exception):
     pass
+
+
+class ChecksumMismatch(NetworkError):
+    pass
+
+
+class RateLimited(NetworkError):
+    """HTTP 429 or 418, ``retry_after`` is the number of seconds the server asked to wait, if any."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,229 @@
+import json
+import os
+import time
+import warnings
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import pandas as pd
+from pandas import Timestamp
+
+from . import config
+from .exceptions import NetworkError
+
+
+@dataclass
+class FileInfo:
+    key: str
+    date: Timestamp
+    size: int
+    etag: str
+    last_modified: Timestamp
+    checksum_key: Optional[str] = None
+
+
+@dataclass
+class FileIndex:
+    monthly: Dict[Timestamp, FileInfo] = field(default_factory=dict)
+    daily: Dict[Timestamp, FileInfo] = field(default_factory=dict)
+
+
+# listings already loaded in this process, keyed by prefix
+_listings: Dict[str, Tuple[float, List[dict], List[str]]] = {}
+
+
+def list_bucket(
+    prefix: str, client: Optional[httpx.Client] = None, max_retries: int = 3
+) -> Tuple[List[dict], List[str]]:
+    """
+    List the objects and sub-prefixes directly under ``prefix`` in the data.binance.vision bucket,
+    following pagination.
+
+    :return: A list of objects with ``key``, ``size``, ``etag`` and ``last_modified``,
+        and a list of common prefixes.
+    """
+    own_client = client is None
+    if own_client:
+        client = httpx.Client(timeout=30)
+
+    objects, prefixes = [], []
+    marker = ""
+    try:
+        while True:
+            params = {"delimiter": "/", "prefix": prefix}
+            if marker:
+                params["marker"] = marker
+            for attempt in range(max_retries):
+                try:
+                    resp = client.get(config.LISTING_URL, params=params)
+                    break
+                except httpx.TransportError as e:
+                    if attempt == max_retries - 1:
+                        raise NetworkError(e)
+                    time.sleep(2**attempt)
+            if resp.status_code != 200:
+                raise NetworkError(f"HTTP {resp.status_code}: {resp.url}")
+
+            try:
+                root = ET.fromstring(resp.content)
+            except ET.ParseError as e:
+                raise NetworkError(f"Unreadable listing of {prefix}: {e}")
+            for content in root.iterfind("{*}Contents"):
+                objects.append(
+                    {
+                        "key": content.findtext("{*}Key"),
+                        "size": int(content.findtext("{*}Size")),
+                        "etag": content.findtext("{*}ETag", "").strip('"'),
+                        "last_modified": content.findtext("{*}LastModified"),
+                    }
+                )
+            for common in root.iterfind("{*}CommonPrefixes"):
+                prefixes.append(common.findtext("{*}Prefix"))
+
+            if root.findtext("{*}IsTruncated") != "true":
+                break
+            marker = root.findtext("{*}NextMarker") or max(
+                [o["key"] for o in objects] + prefixes
+            )
+    finally:
+        if own_client:
+            client.close()
+    return objects, prefixes
+
+
+def get_listing_path(prefix: str) -> Path:
+    return config.CACHE_DIR / "listings" / (prefix.rstrip("/") + ".json")
+
+
+def get_listing(
+    prefix: str, client: Optional[httpx.Client] = None
+) -> Tuple[List[dict], List[str]]:
+    """
+    Return the listing of ``prefix``, from memory or from ``config.CACHE_DIR / 'listings'``
+    while it is younger than ``config.LISTING_TTL`` seconds. A stale listing on disk is
+    still used, with a warning, when the bucket can't be reached.
+    """
+    now = time.time()
+    cached = _listings.get(prefix)
+
+    path = get_listing_path(prefix)
+    if cached is None and path.exists():
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            cached = (data["fetched_at"], data["objects"], data["prefixes"])
+        except (OSError, ValueError, KeyError):
+            cached = None
+
+    if cached is not None and now - cached[0] < config.LISTING_TTL:
+        _listings[prefix] = cached
+        return cached[1], cached[2]
+
+    try:
+        objects, prefixes = list_bucket(prefix, client=client)
+    except NetworkError:
+        if cached is None:
+            raise
+        warnings.warn(f"Using stale listing of {prefix}")
+        return cached[1], cached[2]
+
+    _listings[prefix] = (now, objects, prefixes)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": now, "objects": objects, "prefixes": prefixes}, f)
+    os.replace(tmp, path)
+    return objects, prefixes
+
+
+def parse_file_date(key: str, freq: str) -> Timestamp:
+    """``.../BTCUSDT-1m-2024-01.zip`` -> ``2024-01-01``, ``.../BTCUSDT-1m-2024-01-02.zip`` -> ``2024-01-02``"""
+    parts = key.rsplit("/", 1)[-1].split(".", 1)[0].split("-")
+    n = 2 if freq == "monthly" else 3
+    return Timestamp("-".join(parts[-n:]))
+
+
+@dataclass(frozen=True)
+class DataFile:
+    asset_type: str
+    freq: str
+    data_type: str
+    symbol: str
+    timeframe: Optional[str]
+    date: Timestamp
+
+    @property
+    def period(self) -> Tuple[Timestamp, Timestamp]:
+        """The UTC ``[start, end)`` covered by the file."""
+        start = self.date.tz_localize("UTC")
+        if self.freq == "monthly":
+            return start, start + pd.offsets.MonthBegin()
+        return start, start + pd.Timedelta(days=1)
+
+    @property
+    def month(self) -> Timestamp:
+        return Timestamp(self.date.year, self.date.month, 1)
+
+
+def parse_data_url(url: str) -> DataFile:
+    """
+    https://data.binance.vision/data/spot/monthly/klines/BTCUSDT/1m/BTCUSDT-1m-2022-11.zip
+    https://data.binance.vision/data/futures/um/daily/trades/BTCUSDT/BTCUSDT-trades-2022-11-01.zip
+    """
+    parts = urlparse(url).path.strip("/").split("/")[1:]
+    if parts[0] == "futures":
+        asset_type, parts = "/".join(parts[:2]), parts[2:]
+    else:
+        asset_type, parts = parts[0], parts[1:]
+    freq, data_type, symbol = parts[:3]
+    timeframe = parts[3] if len(parts) == 5 else None
+    return DataFile(
+        asset_type=asset_type,
+        freq=freq,
+        data_type=data_type,
+        symbol=symbol,
+        timeframe=timeframe,
+        date=parse_file_date(parts[-1], freq),
+    )
+
+
+def monthly_url(url: str) -> str:
+    """The url of the monthly file containing the daily file ``url``."""
+    head, name = url.rsplit("/", 1)
+    stem, ext = name.split(".", 1)
+    return f"{head.replace('/daily/', '/monthly/')}/{stem[:-3]}.{ext}"
+
+
+def build_index(objects: List[dict], freq: str) -> Dict[Timestamp, FileInfo]:
+    keys = {o["key"] for o in objects}
+    index = {}
+    for o in objects:
+        if not o["key"].endswith(".zip"):
+            continue
+        checksum_key = o["key"] + ".CHECKSUM"
+        dt = parse_file_date(o["key"], freq)
+        index[dt] = FileInfo(
+            key=o["key"],
+            date=dt,
+            size=o["size"],
+            etag=o["etag"],
+            last_modified=pd.to_datetime(o["last_modified"], utc=True),
+            checksum_key=checksum_key if checksum_key in keys else None,
+        )
+    return dict(sorted(index.items()))
+
+
+def get_file_index(monthly_prefix: str, daily_prefix: Optional[str] = None) -> FileIndex:
+    """Build the index of monthly and daily files of one symbol/data type from the bucket listings."""
+    with httpx.Client(timeout=30) as client:
+        monthly, _ = get_listing(monthly_prefix, client=client)
+        daily = []
+        if daily_prefix is not None:
+            daily, _ = get_listing(daily_prefix, client=client)
+    return FileIndex(
+        monthly=build_index(monthly, "monthly"), daily=build_index(daily, "daily")
+    )
@@ -0,0 +1,327 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+from . import config
+from .listing import parse_data_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS promotions (
+    monthly_url TEXT PRIMARY KEY,
+    daily_urls TEXT NOT NULL,
+    promoted_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    url TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    data_type TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    freq TEXT NOT NULL,
+    period_start INTEGER NOT NULL,
+    period_end INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    checksum TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_by_symbol
+    ON files (asset_type, data_type, symbol, timeframe, period_start);
+CREATE INDEX IF NOT EXISTS files_by_path ON files (path);
+CREATE TABLE IF NOT EXISTS raw (
+    url TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# max number of parameters of one sqlite statement
+_BATCH = 500
+
+_local = threading.local()
+
+
+@dataclass
+class FileRecord:
+    url: str
+    path: Path
+    freq: str
+    period_start: pd.Timestamp
+    period_end: pd.Timestamp
+    rows: int
+    bytes: int
+    checksum: Optional[str]
+
+
+@contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """
+    Open the manifest under ``config.CACHE_DIR``, committing on success. Connections are
+    reused per thread and cache directory.
+    """
+    path = config.CACHE_DIR / "manifest.sqlite"
+    connections = _local.__dict__.setdefault("connections", {})
+    conn = connections.get(path)
+    if conn is None:
+        config.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        _migrate(conn)
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    with conn:
+        yield conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+    if columns and "last_access" not in columns:
+        conn.execute("ALTER TABLE files ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+
+
+def _relative(path: Path) -> str:
+    return Path(path).relative_to(config.CACHE_DIR).as_posix()
+
+
+def _record(row: tuple) -> FileRecord:
+    url, path, freq, period_start, period_end, rows, size, checksum = row
+    return FileRecord(
+        url=url,
+        path=config.CACHE_DIR / path,
+        freq=freq,
+        period_start=pd.Timestamp(period_start, unit="ms", tz="UTC"),
+        period_end=pd.Timestamp(period_end, unit="ms", tz="UTC"),
+        rows=rows,
+        bytes=size,
+        checksum=checksum,
+    )
+
+
+_COLUMNS = "url, path, freq, period_start, period_end, rows, bytes, checksum"
+
+
+def record_file(
+    url: str, path: Path, rows: int, checksum: Optional[str] = None
+) -> None:
+    """Record that the rows of the zip at ``url`` are cached in ``path``."""
+    file = parse_data_url(url)
+    start, end = file.period
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                _relative(path),
+                file.asset_type,
+                file.data_type,
+                file.symbol,
+                file.timeframe or "",
+                file.freq,
+                start.value // 10**6,
+                end.value // 10**6,
+                rows,
+                Path(path).stat().st_size,
+                checksum,
+                now,
+                now,
+            ),
+        )
+
+
+def lookup_file(url: str) -> Optional[FileRecord]:
+    with connect() as conn:
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM files WHERE url = ?", (url,)
+        ).fetchone()
+    return None if row is None else _record(row)
+
+
+def lookup_files(urls: Iterable[str]) -> Dict[str, FileRecord]:
+    """The records of every cached url among ``urls``, in one query per 500 urls."""
+    urls = list(urls)
+    records = {}
+    with connect() as conn:
+        for i in range(0, len(urls), _BATCH):
+            batch = urls[i : i + _BATCH]
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM files WHERE url IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            records.update({row[0]: _record(row) for row in rows})
+    return records
+
+
+def forget_files(urls: Iterable[str]) -> None:
+    with connect() as conn:
+        conn.executemany("DELETE FROM files WHERE url = ?", [(url,) for url in urls])
+
+
+def forget_path(path: Path) -> None:
+    """Forget every url cached in ``path``, e.g. once the file is found corrupted or deleted."""
+    with connect() as conn:
+        conn.execute("DELETE FROM files WHERE path = ?", (_relative(path),))
+
+
+def record_raw(url: str, checksum: str, size: int) -> None:
+    """Record that the zip of ``url`` is kept raw under its sha256 ``checksum``."""
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO raw VALUES (?, ?, ?, ?)", (url, checksum, size, time.time())
+        )
+
+
+def lookup_raw(url: str) -> Optional[str]:
+    """The sha256 of the raw zip kept for ``url``, or None."""
+    with connect() as conn:
+        row = conn.execute("SELECT checksum FROM raw WHERE url = ?", (url,)).fetchone()
+    return None if row is None else row[0]
+
+
+def forget_raw(url: str) -> None:
+    with connect() as conn:
+        conn.execute("DELETE FROM raw WHERE url = ?", (url,))
+
+
+def touch_file(url: str) -> None:
+    """Count a cache hit on ``url`` and mark it as the most recently read."""
+    with connect() as conn:
+        conn.execute("UPDATE files SET last_access = ? WHERE url = ?", (time.time(), url))
+        _bump(conn, "hits")
+
+
+def record_miss() -> None:
+    with connect() as conn:
+        _bump(conn, "misses")
+
+
+def _bump(conn: sqlite3.Connection, name: str, n: int = 1) -> None:
+    conn.execute(
+        "INSERT INTO stats VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+        (name, n),
+    )
+
+
+def read_stats() -> Dict[str, int]:
+    with connect() as conn:
+        stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        # several urls share the size of a store partition
+        files, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0)"
+            " FROM (SELECT MAX(bytes) AS bytes FROM files GROUP BY path)"
+        ).fetchone()
+    return {
+        "hits": stats.get("hits", 0),
+        "misses": stats.get("misses", 0),
+        "evictions": stats.get("evictions", 0),
+        "evicted_bytes": stats.get("evicted_bytes", 0),
+        "files": files,
+        "bytes": size,
+    }
+
+
+def is_pinned(symbol: str, data_type: str) -> bool:
+    return any(
+        (pin_symbol is None or pin_symbol == symbol)
+        and (pin_data_type is None or pin_data_type == data_type)
+        for pin_symbol, pin_data_type in config.CACHE_PINNED
+    )
+
+
+def evict(max_bytes: int, keep: Optional[Path] = None) -> List[Path]:
+    """
+    Delete the least recently read files until the cache holds at most ``max_bytes``.
+    Files of pinned symbols and data types and ``keep`` are never deleted.
+
+    :return: The deleted files.
+    """
+    with connect() as conn:
+        rows = conn.execute(
+            "SELECT path, MAX(bytes), MAX(last_access), symbol, data_type FROM files"
+            " GROUP BY path, symbol, data_type"
+        ).fetchall()
+
+    total = sum(size for _, size, *_ in rows)
+    if total <= max_bytes:
+        return []
+
+    keep = None if keep is None else _relative(keep)
+    candidates = sorted(
+        (last_access, path, size)
+        for path, size, last_access, symbol, data_type in rows
+        if path != keep and not is_pinned(symbol, data_type)
+    )
+
+    evicted = []
+    with connect() as conn:
+        for _, path, size in candidates:
+            if total <= max_bytes:
+                break
+            (config.CACHE_DIR / path).unlink(missing_ok=True)
+            conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            _bump(conn, "evictions")
+            _bump(conn, "evicted_bytes", size)
+            evicted.append(config.CACHE_DIR / path)
+            total -= size
+    return evicted
+
+
+def coverage(
+    asset_type: str, data_type: str, symbol: str, timeframe: Optional[str] = None
+) -> DataFrame:
+    """The cached files of a symbol ordered by the UTC period they cover."""
+    with connect() as conn:
+        df = pd.read_sql_query(
+            f"SELECT {_COLUMNS} FROM files"
+            " WHERE asset_type = ? AND data_type = ? AND symbol = ? AND timeframe = ?"
+            " ORDER BY period_start",
+            conn,
+            params=(asset_type, data_type, symbol, timeframe or ""),
+        )
+    for name in ("period_start", "period_end"):
+        df[name] = pd.to_datetime(df[name], unit="ms", utc=True)
+    return df
+
+
+def high_water_mark(
+    asset_type: str, data_type: str, symbol: str, timeframe: Optional[str] = None
+) -> Optional[pd.Timestamp]:
+    """The UTC end of the latest cached file of a symbol, or None if nothing is cached."""
+    with connect() as conn:
+        (period_end,) = conn.execute(
+            "SELECT MAX(period_end) FROM files"
+            " WHERE asset_type = ? AND data_type = ? AND symbol = ? AND timeframe = ?",
+            (asset_type, data_type, symbol, timeframe or ""),
+        ).fetchone()
+    return None if period_end is None else pd.Timestamp(period_end, unit="ms", tz="UTC")
+
+
+def record_promotion(monthly_url: str, daily_urls: List[str]) -> None:
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO promotions VALUES (?, ?, ?)",
+            (monthly_url, json.dumps(sorted(daily_urls)), time.time()),
+        )
+
+
+def read_promotions() -> DataFrame:
+    with connect() as conn:
+        df = pd.read_sql_query("SELECT * FROM promotions ORDER BY promoted_at", conn)
+    df["daily_urls"] = df["daily_urls"].map(json.loads)
+    df["promoted_at"] = pd.to_datetime(df["promoted_at"], unit="s", utc=True)
+    return df
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pandas import DataFrame
+
+from . import config
+
+
+class MemoryCache:
+    """
+    A least recently used cache of parsed files keyed by url, holding at most
+    ``config.MEMORY_CACHE_BYTES`` bytes of frames.
+    """
+
+    def __init__(self):
+        self._frames: "OrderedDict[str, Tuple[DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[DataFrame]:
+        with self._lock:
+            entry = self._frames.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(url)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, url: str, df: DataFrame) -> None:
+        budget = config.MEMORY_CACHE_BYTES or 0
+        size = int(df.memory_usage(index=True).sum())
+        with self._lock:
+            old = self._frames.pop(url, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > budget:
+                return
+            self._frames[url] = (df, size)
+            self.size += size
+            while self.size > budget:
+                _, (_, evicted) = self._frames.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "files": len(self._frames),
+                "bytes": self.size,
+            }
+
+
+memory_cache = MemoryCache()
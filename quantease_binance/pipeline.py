@@ -0,0 +1,70 @@
+import asyncio
+import atexit
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple, TypeVar
+
+from . import config
+
+T = TypeVar("T")
+
+# decode pools shared by every event loop, keyed by kind and number of workers
+_executors: Dict[Tuple[str, int], Executor] = {}
+# files downloading or waiting to be decoded, per event loop
+_queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_executor() -> Optional[Executor]:
+    """
+    The pool decoding downloads as configured by ``config.DECODE_EXECUTOR`` and
+    ``config.DECODE_WORKERS``, or None to decode on the event loop. Process pools are
+    started once and see the config of the moment they started.
+    """
+    kind = config.DECODE_EXECUTOR
+    if kind is None:
+        return None
+    workers = config.DECODE_WORKERS or os.cpu_count() or 1
+    executor = _executors.get((kind, workers))
+    if executor is None:
+        if kind == "process":
+            executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind == "thread":
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        else:
+            raise ValueError(f"Unknown decode executor: {kind}")
+        _executors[(kind, workers)] = executor
+    return executor
+
+
+@atexit.register
+def shutdown() -> None:
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
+
+
+@asynccontextmanager
+async def reserve() -> AsyncIterator[None]:
+    """
+    Hold one of the ``config.DECODE_QUEUE_SIZE`` places of the current event loop from the
+    start of a download to the end of its decoding, so downloads wait for the decoders
+    instead of piling up files.
+    """
+    loop = asyncio.get_running_loop()
+    queue = _queues.get(loop)
+    if queue is None:
+        queue = _queues[loop] = asyncio.Semaphore(config.DECODE_QUEUE_SIZE)
+    async with queue:
+        yield
+
+
+async def decode(func: Callable[..., T], *args) -> T:
+    """Run ``func(*args)`` in the decode pool. ``func`` and ``args`` must pickle for a process pool."""
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
@@ -0,0 +1,273 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pandas import DataFrame, Timestamp
+
+from . import config
+from .constants import TIME_COLUMNS
+from .listing import DataFile, monthly_url, parse_data_url
+from .manifest import lookup_files, record_file
+
+# parquet schema metadata listing the urls a partition was built from
+SOURCES_KEY = b"quantease_binance.sources"
+
+
+def get_store_dir(
+    asset_type: str, data_type: str, symbol: str, timeframe: Optional[str] = None
+) -> Path:
+    path = config.CACHE_DIR / "store" / asset_type / data_type / symbol
+    if timeframe is not None:
+        path = path / timeframe
+    return path
+
+
+def get_landing_dir(
+    asset_type: str, freq: str, data_type: str, symbol: str, timeframe: Optional[str] = None
+) -> Path:
+    """Directory of the per-zip parquet files written by ``save_data_to_disk``."""
+    path = config.CACHE_DIR / "data" / asset_type / freq / data_type / symbol
+    if timeframe is not None:
+        path = path / timeframe
+    return path
+
+
+def landing_url(path: Path) -> str:
+    """The url of the zip a per-zip parquet file under ``config.CACHE_DIR / 'data'`` was parsed from."""
+    return f"{config.DATA_URL}/" + path.relative_to(config.CACHE_DIR).with_suffix(".zip").as_posix()
+
+
+def get_partition_path(store_dir: Path, month: Timestamp) -> Path:
+    return store_dir / f"year={month.year}" / f"month={month.month:02d}" / "data.parquet"
+
+
+def read_sources(path: Path) -> Set[str]:
+    metadata = pq.read_schema(path).metadata or {}
+    return set(json.loads(metadata.get(SOURCES_KEY, b"[]")))
+
+
+def key_column(data_type: str) -> str:
+    """
+    The UTC epoch milliseconds column cached files are sorted and filtered on. It's the time
+    column of the csv, except for ``metrics`` whose time column is a string.
+    """
+    return "datetime" if data_type == "metrics" else TIME_COLUMNS[data_type]
+
+
+def _epoch_ms(dt: Timestamp) -> int:
+    dt = Timestamp(dt)
+    if dt.tz is None:
+        dt = dt.tz_localize("UTC")
+    return dt.value // 10**6
+
+
+def time_filter(
+    field: str, dtype: pa.DataType, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None
+) -> Optional[ds.Expression]:
+    """
+    A ``[start, end)`` filter on the key column ``field``, typed like the column so it can be
+    pushed down. ``field`` holds epoch milliseconds, or timestamps in files cached before the
+    cache became timezone independent.
+    """
+    if pa.types.is_timestamp(dtype):
+        scalar = lambda dt: pa.scalar(Timestamp(dt), type=dtype)
+    else:
+        scalar = lambda dt: pa.scalar(_epoch_ms(dt), type=dtype)
+    expr = None
+    if start is not None:
+        expr = ds.field(field) >= scalar(start)
+    if end is not None:
+        cond = ds.field(field) < scalar(end)
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def _key_field(schema: pa.Schema, data_type: str) -> pa.Field:
+    # files cached before the cache became timezone independent have a timestamp column
+    if "datetime" in schema.names and pa.types.is_timestamp(schema.field("datetime").type):
+        return schema.field("datetime")
+    return schema.field(key_column(data_type))
+
+
+def _to_frame(table: pa.Table, key: str, columns: Optional[List[str]] = None) -> DataFrame:
+    """Index a table read from the cache by its UTC datetimes, keeping ``columns`` if given."""
+    df = table.to_pandas(ignore_metadata=True)
+    if key == "datetime" or (columns is not None and key not in columns):
+        values = df.pop(key)
+    else:
+        values = df[key]
+    if pa.types.is_timestamp(table.schema.field(key).type):
+        index = pd.DatetimeIndex(values).tz_convert("UTC")
+    else:
+        index = pd.to_datetime(values.to_numpy(), unit="ms", utc=True)
+    df.index = index.rename("datetime")
+    return df
+
+
+def check_columns(names: List[str], columns: Optional[List[str]]) -> None:
+    """Raise a ValueError if any of ``columns`` isn't among the column ``names`` of the data."""
+    if columns is None:
+        return
+    unknown = [name for name in columns if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}, the data has {list(names)}")
+
+
+def read_parquet(
+    path: Path,
+    data_type: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> DataFrame:
+    """
+    Read a cached file of ``data_type`` as a frame indexed by UTC datetimes, pushing the projection
+    and time range into the reader.
+    """
+    schema = pq.read_schema(path)
+    check_columns(schema.names, columns)
+    key = _key_field(schema, data_type)
+    table = pq.read_table(
+        path,
+        columns=None if columns is None else list(dict.fromkeys(columns + [key.name])),
+        filters=time_filter(key.name, key.type, start, end),
+    )
+    return _to_frame(table, key.name, columns)
+
+
+def read_data_file(
+    url: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> Optional[DataFrame]:
+    """Read the rows of the zip at ``url`` from the store, or None if it hasn't been compacted."""
+    file = parse_data_url(url)
+    store_dir = get_store_dir(file.asset_type, file.data_type, file.symbol, file.timeframe)
+    path = get_partition_path(store_dir, file.month)
+    if not path.exists():
+        return None
+
+    sources = read_sources(path)
+    if url not in sources and (file.freq != "daily" or monthly_url(url) not in sources):
+        return None
+
+    period_start, period_end = file.period
+    if start is not None:
+        period_start = max(period_start, start)
+    if end is not None:
+        period_end = min(period_end, end)
+    return read_parquet(path, file.data_type, columns, period_start, period_end)
+
+
+def read_store(
+    symbol: str,
+    asset_type: str,
+    data_type: str,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+    timeframe: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> Optional[DataFrame]:
+    """
+    Read ``[start, end)`` of a symbol's compacted data, indexed by UTC datetimes. Partitions
+    outside the range are pruned by year/month and row groups by the statistics of the key column.
+    """
+    store_dir = get_store_dir(asset_type, data_type, symbol, timeframe)
+    if not store_dir.exists():
+        return None
+
+    first = None if start is None else Timestamp(start).tz_convert("UTC").tz_localize(None)
+    last = None if end is None else Timestamp(end).tz_convert("UTC").tz_localize(None)
+    frames = []
+    for path in sorted(store_dir.glob("year=*/month=*/data.parquet")):
+        month = Timestamp(int(path.parent.parent.name[5:]), int(path.parent.name[6:]), 1)
+        if first is not None and month + pd.offsets.MonthBegin() <= first:
+            continue
+        if last is not None and month >= last:
+            continue
+        frames.append(read_parquet(path, data_type, columns, start, end))
+    if not frames:
+        return None
+    return pd.concat(frames).sort_index(kind="stable")
+
+
+def to_store_frame(data_type: str, df: DataFrame) -> DataFrame:
+    """
+    Turn a loaded frame into the timezone independent layout of the cache: the csv columns,
+    with UTC epoch milliseconds in ``key_column(data_type)``, and no datetime index.
+    """
+    key = key_column(data_type)
+    index = df.index.tz_convert("UTC")
+    df = df.reset_index(drop=True)
+    if key == "datetime":
+        df.insert(0, key, index.as_unit("ms").asi8)
+    return df
+
+
+def write_partition(path: Path, df: DataFrame, sources: Set[str]) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCES_KEY] = json.dumps(sorted(sources)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    pq.write_table(
+        table, tmp, row_group_size=config.STORE_ROW_GROUP_SIZE, write_statistics=True
+    )
+    os.replace(tmp, path)
+
+
+def compact_store(
+    symbol: str, asset_type: str, data_type: str, timeframe: Optional[str] = None
+) -> int:
+    """
+    Merge the per-zip parquet files cached for a symbol into one parquet per month under
+    ``config.CACHE_DIR / 'store'``, sorted by time with row-group statistics, and remove
+    the merged files.
+
+    :return: The number of partitions written.
+    """
+    symbol = symbol.upper().replace("/", "")
+    store_dir = get_store_dir(asset_type, data_type, symbol, timeframe)
+
+    groups: Dict[Timestamp, List[Tuple[str, Path]]] = {}
+    for freq in ("monthly", "daily"):
+        landing_dir = get_landing_dir(asset_type, freq, data_type, symbol, timeframe)
+        if not landing_dir.exists():
+            continue
+        for path in sorted(landing_dir.glob("*.parquet")):
+            url = landing_url(path)
+            groups.setdefault(parse_data_url(url).month, []).append((url, path))
+
+    for month, files in groups.items():
+        partition = get_partition_path(store_dir, month)
+        frames, sources, rows = [], set(), {}
+        if partition.exists():
+            frames.append(to_store_frame(data_type, read_parquet(partition, data_type)))
+            sources |= read_sources(partition)
+
+        for url, path in files:
+            frames.append(to_store_frame(data_type, read_parquet(path, data_type)))
+            sources.add(url)
+            rows[url] = len(frames[-1])
+
+        df = (
+            pd.concat(frames, ignore_index=True)
+            .drop_duplicates()
+            .sort_values(key_column(data_type), kind="stable")
+        )
+        write_partition(partition, df, sources)
+        records = lookup_files(rows)
+        for url, path in files:
+            record = records.get(url)
+            record_file(url, partition, rows[url], record.checksum if record else None)
+            path.unlink()
+
+    return len(groups)
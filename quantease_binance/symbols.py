@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import aiohttp
+import pandas as pd
+from pandas import DataFrame
+from tardis_dev import get_exchange_details
+from tqdm import tqdm
+
+from . import config
+from .exceptions import NetworkError
+from .listing import get_file_index, get_listing
+
+
+class SymbolType(Enum):
+    SPOT = "spot"
+    PERP = "perpetual"
+    FUTURE = "future"
+
+
+TARDIS_EXCHANGES = {
+    "spot": "binance",
+    "futures/um": "binance-futures",
+    "futures/cm": "binance-delivery",
+}
+
+# ids of the aggregated datasets tardis.dev lists among the symbols
+_AGGREGATES = {"FUTURES", "PERPETUALS", "SPOT"}
+
+_COLUMNS = ["id", "type", "availableSince", "availableTo"]
+
+# symbol tables already loaded in this process, keyed by path
+_tables: Dict[Path, Tuple[float, DataFrame]] = {}
+
+
+def get_symbols_path(asset_type: str, source: str = "tardis") -> Path:
+    return config.CACHE_DIR / "symbols" / source / (asset_type.replace("/", "-") + ".json")
+
+
+def list_tardis_symbols(asset_type: str) -> List[dict]:
+    """The symbols tardis.dev lists for ``asset_type``, with ``id``, ``type``, ``availableSince`` and ``availableTo``."""
+    try:
+        res = get_exchange_details(exchange=TARDIS_EXCHANGES[asset_type])
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        raise NetworkError(e)
+    if "datasets" not in res:
+        raise NetworkError(res.get("message", res))
+    return [
+        {name: s[name] for name in _COLUMNS}
+        for s in res["datasets"]["symbols"]
+        if s["id"] not in _AGGREGATES
+    ]
+
+
+def bucket_symbol_type(asset_type: str, symbol: str) -> SymbolType:
+    """``BTCUSDT`` and ``BTCUSD_PERP`` are perpetuals, ``BTCUSDT_240329`` is a delivery future."""
+    if asset_type == "spot":
+        return SymbolType.SPOT
+    if "_" in symbol and not symbol.endswith("_PERP"):
+        return SymbolType.FUTURE
+    return SymbolType.PERP
+
+
+def list_bucket_symbols(asset_type: str) -> List[dict]:
+    """
+    The symbols of ``asset_type`` on data.binance.vision, with ``id``, ``type``, ``availableSince``
+    and ``availableTo`` taken from the first and last daily klines they have files for.
+    """
+    ids = set()
+    for freq in ("monthly", "daily"):
+        _, prefixes = get_listing(f"data/{asset_type}/{freq}/klines/")
+        ids.update(prefix.rstrip("/").rsplit("/", 1)[-1] for prefix in prefixes)
+
+    def list_symbol(symbol):
+        index = get_file_index(
+            f"data/{asset_type}/monthly/klines/{symbol}/1d/",
+            f"data/{asset_type}/daily/klines/{symbol}/1d/",
+        )
+        starts, ends = [], []
+        if index.monthly:
+            starts.append(min(index.monthly))
+            ends.append(max(index.monthly) + pd.offsets.MonthBegin())
+        if index.daily:
+            starts.append(min(index.daily))
+            ends.append(max(index.daily) + pd.Timedelta(days=1))
+        if not starts:
+            return None
+        return {
+            "id": symbol,
+            "type": bucket_symbol_type(asset_type, symbol).value,
+            "availableSince": min(starts).tz_localize("UTC").isoformat(),
+            "availableTo": max(ends).tz_localize("UTC").isoformat(),
+        }
+
+    with ThreadPoolExecutor(max_workers=config.PROBE_WORKERS) as executor:
+        records = list(
+            tqdm(
+                executor.map(list_symbol, sorted(ids)),
+                total=len(ids), desc="Listing symbols", unit="symbol",
+            )
+        )
+    return [record for record in records if record is not None]
+
+
+SOURCES: Dict[str, Callable[[str], List[dict]]] = {
+    "tardis": list_tardis_symbols,
+    "bucket": list_bucket_symbols,
+}
+
+
+def _to_frame(records: List[dict]) -> DataFrame:
+    df = DataFrame(records, columns=_COLUMNS).set_index("id")
+    for name in ("availableSince", "availableTo"):
+        df[name] = pd.to_datetime(df[name], utc=True, format="ISO8601")
+    return df
+
+
+def get_symbol_table(asset_type: str, refresh: bool = False, source: str = "tardis") -> DataFrame:
+    """
+    Return the symbols of ``asset_type`` listed by ``source`` indexed by id, from memory or
+    from ``config.CACHE_DIR / 'symbols'`` while younger than ``config.SYMBOLS_TTL`` seconds,
+    unless ``refresh``. Stale symbols on disk are still used, with a warning, when the
+    source can't be reached.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source of symbols: {source}")
+    now = time.time()
+    path = get_symbols_path(asset_type, source)
+    cached = _tables.get(path)
+
+    if cached is None and path.exists():
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            cached = (data["fetched_at"], _to_frame(data["symbols"]))
+        except (OSError, ValueError, KeyError):
+            cached = None
+
+    if cached is not None and not refresh and now - cached[0] < config.SYMBOLS_TTL:
+        _tables[path] = cached
+        return cached[1]
+
+    try:
+        records = SOURCES[source](asset_type)
+    except NetworkError:
+        if cached is None:
+            raise
+        warnings.warn(f"Using stale {source} symbols of {asset_type}")
+        return cached[1]
+
+    table = _to_frame(records)
+    _tables[path] = (now, table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": now, "symbols": records}, f)
+    os.replace(tmp, path)
+    return table
@@ -0,0 +1,132 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+from . import config
+from .exceptions import NetworkError, RateLimited
+
+
+class Slot:
+    """A permission to send one request, handed out by ``AdaptiveLimiter.slot``."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.latency = None
+
+    def responded(self) -> None:
+        """Mark the arrival of the response headers, to measure the time to first byte."""
+        self.latency = asyncio.get_running_loop().time() - self.started
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD controller of the downloads in flight and of their rate. Every successful request
+    raises the limits by about one per round trip, up to ``max_concurrency`` and ``max_rate``.
+    Throttling (HTTP 429/418), server errors, timeouts and a time to first byte beyond
+    ``config.THROTTLE_LATENCY_FACTOR`` times the fastest seen halve them, at most once per
+    ``config.THROTTLE_COOLDOWN`` seconds, and a ``Retry-After`` pauses every new request.
+
+    :param max_concurrency: The maximum number of requests in flight.
+    :param max_rate: The maximum number of requests started per second, None for no pacing.
+    :param initial_concurrency: The number of requests in flight allowed at first.
+        Default is a quarter of ``max_concurrency``.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_rate: Optional[float] = None,
+        initial_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_rate = max_rate
+        self.concurrency = float(initial_concurrency or max(min_concurrency, max_concurrency // 4))
+        self.rate = max_rate
+        self.in_flight = 0
+        self.successes = 0
+        self.backoffs = 0
+        self._min_latency = None
+        self._last_backoff = float("-inf")
+        self._paused_until = 0.0
+        self._next_start = 0.0
+        self._cond = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        await self._acquire()
+        slot = Slot(asyncio.get_running_loop().time())
+        try:
+            yield slot
+        except RateLimited as e:
+            self._back_off(e.retry_after)
+            raise
+        except (NetworkError, aiohttp.ClientError, asyncio.TimeoutError):
+            self._back_off()
+            raise
+        else:
+            self._on_success(slot.latency)
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    async def _acquire(self) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        async with self._cond:
+            while True:
+                now = loop.time()
+                delay = max(self._paused_until, self._next_start) - now
+                if delay <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                try:
+                    await asyncio.wait_for(self._cond.wait(), delay if delay > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            if self.rate is not None:
+                self._next_start = max(now, self._next_start) + 1 / self.rate
+
+    def _on_success(self, latency: Optional[float]) -> None:
+        self.successes += 1
+        if latency is not None:
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+            elif latency > config.THROTTLE_LATENCY_FACTOR * max(self._min_latency, 0.01):
+                self._back_off()
+                return
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        if self.rate is not None:
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+
+    def _back_off(self, retry_after: Optional[float] = None) -> None:
+        now = asyncio.get_running_loop().time()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now - self._last_backoff < config.THROTTLE_COOLDOWN:
+            return
+        self._last_backoff = now
+        self.backoffs += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        if self.rate is not None:
+            self.rate = max(self.max_rate / 64, self.rate / 2)
+
+
+@asynccontextmanager
+async def acquire(limiter) -> AsyncIterator[Slot]:
+    """
+    A slot of an ``AdaptiveLimiter``. A plain ``asynciolimiter.Limiter`` is only waited on,
+    and None lets the request through.
+    """
+    if isinstance(limiter, AdaptiveLimiter):
+        async with limiter.slot() as slot:
+            yield slot
+        return
+    if limiter is not None:
+        await limiter.wait()
+    yield Slot(asyncio.get_running_loop().time())
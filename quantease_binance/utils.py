@@ -1,27 +1,63 @@
 import datetime
+import hashlib
 import io
+import json
 import asyncio
 import asynciolimiter
 import os
 import time
 import os.path
+import shutil
+import threading
+import uuid
 import zipfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
+from typing import IO, Dict, List, Mapping, Optional, Tuple, Union
 from urllib.parse import urlparse
 from dataclasses import dataclass
 from dateutil import parser
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 import httpx
 import aiohttp
+import numpy as np
 import pandas as pd
 
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
 # import pendulum
 from pandas import Timestamp, DataFrame
 
 from . import config
-from .exceptions import NetworkError, DataNotFound
+from .constants import CSV_SCHEMAS, REDUNDANT_COLUMNS, TIME_COLUMNS
+from .exceptions import ChecksumMismatch, NetworkError, DataNotFound, RateLimited
+from .listing import FileIndex, get_file_index, parse_data_url
+from .manifest import (
+    coverage,
+    evict,
+    forget_files,
+    forget_path,
+    forget_raw,
+    lookup_file,
+    lookup_raw,
+    record_file,
+    record_miss,
+    record_raw,
+    touch_file,
+)
+from .memory import memory_cache
+from .pipeline import decode, reserve
+from .store import check_columns, read_data_file, read_parquet, to_store_frame
+from .throttle import AdaptiveLimiter, acquire
 
 
 @dataclass
@@ -39,6 +75,21 @@ class Symbol:
         return False
 
 
+def gen_data_prefix(
+    data_type: str,
+    asset_type: str,
+    freq: str,
+    symbol: str,
+    timeframe: Optional[str] = None,
+) -> str:
+    """
+    data/spot/monthly/klines/BTCUSDT/1m/
+    data/futures/um/daily/trades/BTCUSDT/
+    """
+    url = gen_data_url(data_type, asset_type, freq, symbol, Timestamp(2000, 1, 1), timeframe)
+    return urlparse(url).path.lstrip("/").rsplit("/", 1)[0] + "/"
+
+
 def gen_data_url(
     data_type: str,
     asset_type: str,
@@ -68,24 +119,24 @@ def gen_data_url(
         if timeframe is None:
             raise ValueError("'timeframe' must not be None when data_type is 'klines'")
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}/{timeframe}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}/{timeframe}"
             f"/{symbol}-{timeframe}-{date_str}.zip"
         )
     elif data_type == "trades":
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}"
             f"/{symbol}-{data_type}-{date_str}.zip"
         )
     elif data_type == "aggTrades":
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}"
             f"/{symbol}-{data_type}-{date_str}.zip"
         )
     elif data_type == "bookTicker":
         if asset_type != "futures/cm":
             raise ValueError(f"asset_type must be 'futures/cm', but got '{asset_type}'")
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}"
             f"/{symbol}-{data_type}-{date_str}.zip"
         )
     elif data_type == "fundingRate":
@@ -94,7 +145,7 @@ def gen_data_url(
                 f"asset_type must be 'futures/cm' or 'future/um', but got '{asset_type}'"
             )
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}"
             f"/{symbol}-{data_type}-{date_str}.zip"
         )
     elif data_type == "metrics":
@@ -103,7 +154,7 @@ def gen_data_url(
                 f"asset_type must be 'futures/cm' or 'future/um', but got '{asset_type}'"
             )
         url = (
-            f"https://data.binance.vision/data/{asset_type}/{freq}/{data_type}/{symbol}"
+            f"{config.DATA_URL}/data/{asset_type}/{freq}/{data_type}/{symbol}"
             f"/{symbol}-{data_type}-{date_str}.zip"
         )
     else:
@@ -131,17 +182,21 @@ def unify_datetime(input: Union[str, datetime.datetime]) -> datetime.datetime:
         raise TypeError(f"Unsupported input type: {type(input)}")
 
 
-def exists_month(month_url, max_retries=5):
+PROBE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+
+def exists_month(month_url, max_retries=5, client: Optional[httpx.Client] = None):
     if get_local_data_path(month_url).exists():
         return True
-        
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    
+
     for attempt in range(max_retries):
         try:
-            resp = httpx.get(month_url, headers=headers)
+            if client is None:
+                resp = httpx.head(month_url, headers=PROBE_HEADERS)
+            else:
+                resp = client.head(month_url)
             
             if resp.status_code == 200:
                 return True
@@ -158,6 +213,69 @@ def exists_month(month_url, max_retries=5):
             continue
 
 
+# serializes the read-modify-write of availability.json between threads
+_availability_lock = threading.Lock()
+
+
+def get_availability_path() -> Path:
+    return config.CACHE_DIR / "availability.json"
+
+
+def load_availability() -> Dict[str, List]:
+    path = get_availability_path()
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_availability(availability: Dict[str, List]) -> None:
+    path = get_availability_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(availability, f)
+    os.replace(tmp, path)
+
+
+def probe_months(month_urls: List[str]) -> Dict[str, bool]:
+    """
+    Check which of ``month_urls`` exist with concurrent HEAD requests. Answers are memoized in
+    ``config.CACHE_DIR / 'availability.json'``: existing files are never probed again, missing
+    ones are re-probed after ``config.PROBE_NEGATIVE_TTL`` seconds.
+    """
+    availability = load_availability()
+    now = time.time()
+
+    result = {}
+    pending = []
+    for url in dict.fromkeys(month_urls):
+        cached = availability.get(url)
+        if cached is not None and (cached[0] or now - cached[1] < config.PROBE_NEGATIVE_TTL):
+            result[url] = cached[0]
+        else:
+            pending.append(url)
+
+    if pending:
+        with httpx.Client(headers=PROBE_HEADERS) as client:
+            with ThreadPoolExecutor(max_workers=config.PROBE_WORKERS) as executor:
+                exists = list(
+                    executor.map(lambda url: exists_month(url, client=client), pending)
+                )
+        with _availability_lock:
+            # merge into the latest file, other threads may have saved answers meanwhile
+            availability = load_availability()
+            for url, ok in zip(pending, exists):
+                result[url] = ok
+                availability[url] = [ok, now]
+            save_availability(availability)
+
+    return result
+
+
 def gen_dates(
     data_type: str,
     asset_type: str,
@@ -179,6 +297,107 @@ def gen_dates(
 
     assert len(months) > 0
 
+    planned = plan_cached(data_type, asset_type, symbol, start, end, timeframe)
+    if planned is not None:
+        return planned
+
+    try:
+        index = get_file_index(
+            gen_data_prefix(data_type, asset_type, "monthly", symbol, timeframe),
+            gen_data_prefix(data_type, asset_type, "daily", symbol, timeframe)
+            if data_type != "fundingRate"
+            else None,
+        )
+    except NetworkError as e:
+        warnings.warn(f"Bucket listing unavailable ({e}), probing monthly files instead")
+        return probe_dates(data_type, asset_type, symbol, months, end, timeframe)
+
+    return plan_dates(index, months, start, end)
+
+
+def plan_dates(
+    index: FileIndex, months: List[Timestamp], start: Timestamp, end: Timestamp
+):
+    """
+    Split ``months`` into the months with a monthly file and the days with a daily file covering
+    the rest of ``[start, end)``, using the file index built from the bucket listing.
+    """
+    planned, days, missing = [], [], []
+    first_day = start.normalize()
+    for month in months:
+        if month in index.monthly:
+            planned.append(month)
+            continue
+        month_end = month + pd.offsets.MonthBegin()
+        month_days = [
+            d for d in index.daily if month <= d < month_end and first_day <= d < end
+        ]
+        if month_days:
+            days.extend(month_days)
+        elif month < end:
+            missing.append(month)
+
+    runs = []
+    for month in missing:
+        if runs and runs[-1][1] + pd.offsets.MonthBegin() == month:
+            runs[-1][1] = month
+        else:
+            runs.append([month, month])
+    for run_start, run_end in runs:
+        warnings.warn(
+            f"Data does not exist for the period: {run_start.strftime('%Y-%m')} to {run_end.strftime('%Y-%m')}"
+        )
+
+    return planned, days
+
+
+def plan_cached(
+    data_type: str,
+    asset_type: str,
+    symbol: str,
+    start: Timestamp,
+    end: Timestamp,
+    timeframe: Optional[str] = None,
+):
+    """
+    Plan ``[start, end)`` from the cache manifest alone, or return None if the cached files
+    don't cover all of it and the bucket has to be consulted.
+    """
+    df = coverage(asset_type, data_type, symbol, timeframe)
+    start, end = start.tz_localize("UTC"), end.tz_localize("UTC")
+    df = df[(df.period_end > start) & (df.period_start < end)]
+    months = set(df.period_start[df.freq == "monthly"])
+
+    planned, days = [], []
+    cursor = start
+    for row in df.itertuples():
+        if row.freq == "daily" and row.period_start.replace(day=1) in months:
+            continue
+        if row.period_start > cursor:
+            return None
+        cursor = max(cursor, row.period_end)
+        (planned if row.freq == "monthly" else days).append(row.period_start.tz_convert(None))
+    if cursor < end:
+        return None
+    return planned, days
+
+
+def probe_dates(
+    data_type: str,
+    asset_type: str,
+    symbol: str,
+    months: List[Timestamp],
+    end: Timestamp,
+    timeframe: Optional[str] = None,
+):
+    month_urls = {
+        month: gen_data_url(
+            data_type, asset_type, "monthly", symbol, month, timeframe=timeframe
+        )
+        for month in months
+    }
+    available = probe_months(list(month_urls.values()))
+
     # if not exists_month(last_month_url):
     #     daily_month = months.pop()
     #     if len(months) > 1:
@@ -204,11 +423,8 @@ def gen_dates(
     start_month = None
     while months:
         month = months[-1]
-        month_url = gen_data_url(
-            data_type, asset_type, "monthly", symbol, month, timeframe=timeframe
-        )
 
-        if exists_month(month_url):
+        if available[month_urls[month]]:
             break
 
         months.pop()
@@ -227,11 +443,7 @@ def gen_dates(
         days = []
 
     non_existent_start = None
-    while months and not exists_month(
-        gen_data_url(
-            data_type, asset_type, "monthly", symbol, months[0], timeframe=timeframe
-        )
-    ):
+    while months and not available[month_urls[months[0]]]:
         if non_existent_start is None:
             non_existent_start = months[0]
         months.pop(0)
@@ -253,21 +465,28 @@ def get_data(
     data_tz: str,
     timeframe: Optional[str] = None,
     save_local: bool = False,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+    client: Optional[httpx.Client] = None,
 ) -> DataFrame:
     if data_type == "klines":
         assert timeframe is not None
 
     url = gen_data_url(data_type, asset_type, freq, symbol, dt, timeframe)
 
-    df = load_data_from_disk(url)
+    df = load_cached_data(url, data_tz, columns, start, end)
     if df is None:
         try:
-            df = download_data(data_type, data_tz, url)
+            df = download_data(data_type, data_tz, url, client=client)
             save_data_to_disk(url, df, save_local)
+            if config.MEMORY_CACHE_BYTES:
+                memory_cache.put(url, df.copy())
         except DataNotFound:
             warn = f"Data not found: {url}"
             warnings.warn(warn)
             return None
+        df = select_data(df, columns, start, end)
     return df
 
 
@@ -281,28 +500,263 @@ async def get_data_async(
     timeframe: Optional[str] = None,
     save_local: bool = False,
     session: aiohttp.ClientSession = None,
-    limiter: asynciolimiter.Limiter = None,
+    limiter: Union[AdaptiveLimiter, asynciolimiter.Limiter, None] = None,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
 ) -> DataFrame:
     if data_type == "klines":
         assert timeframe is not None
 
     url = gen_data_url(data_type, asset_type, freq, symbol, dt, timeframe)
 
-    df = load_data_from_disk(url)
+    # disk reads and writes run in threads, keeping the event loop free for the network
+    df = await asyncio.to_thread(load_cached_data, url, data_tz, columns, start, end)
     if df is None:
         try:
             df = await download_data_async(
                 data_type, data_tz, url, session=session, limiter=limiter
             )
-            save_data_to_disk(url, df, save_local)
+            await asyncio.to_thread(save_data_to_disk, url, df, save_local)
+            if config.MEMORY_CACHE_BYTES:
+                memory_cache.put(url, df.copy())
         except DataNotFound:
             warn = f"Data not found: {url}"
             warnings.warn(warn)
             return None
+        df = select_data(df, columns, start, end)
     return df
 
 
-def download_data(data_type: str, data_tz: str, url: str) -> DataFrame:
+def load_cached_data(
+    url: str,
+    data_tz: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> Optional[DataFrame]:
+    """
+    Read the rows of ``url`` from the memory cache, or from disk when it's disabled or misses.
+    Files are kept in memory whole, so a later call can select other columns or ranges.
+    """
+    if not config.MEMORY_CACHE_BYTES:
+        return load_data_from_disk(url, data_tz, columns, start, end)
+
+    df = memory_cache.get(url)
+    if df is None:
+        df = load_data_from_disk(url)
+        if df is None:
+            return None
+        memory_cache.put(url, df)
+    # a copy, callers are free to modify what they get
+    df = select_data(df, columns, start, end).copy()
+    df.index = df.index.tz_convert(data_tz)
+    return df
+
+
+def select_data(
+    df: DataFrame,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> DataFrame:
+    """Trim a freshly downloaded frame like ``load_data_from_disk`` trims cached ones."""
+    check_columns(df.columns, columns)
+    if start is not None:
+        df = df[start <= df.index]
+    if end is not None:
+        df = df[df.index < end]
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+def lock_file(path: Path) -> Optional[IO[bytes]]:
+    """
+    Take an exclusive lock on ``path`` without waiting, held until the returned file is
+    closed, or return None if someone else holds it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        f = open(path, "ab")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return None
+        # the holder removes the lock file before releasing it, so a lock taken on the
+        # removed file must be taken again on the current one
+        try:
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+class PartialDownload:
+    """
+    The bytes of ``url`` received so far, kept in ``config.CACHE_DIR / 'partial'`` with the
+    ETag or Last-Modified of the response, so a failed or interrupted transfer resumes with
+    a Range request instead of starting over, also in a later process.
+
+    The partial file of a url is locked by the download using it until ``release``, or the
+    end of its ``with`` block. A concurrent download of the same url uses a partial file of
+    its own, which isn't kept.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.path = config.CACHE_DIR / "partial" / (urlparse(url).path[1:] + ".part")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.lock = lock_file(self.lock_path)
+        self.shared = self.lock is not None
+        if not self.shared:
+            self.path = self.path.with_name(f"{self.path.stem}.{uuid.uuid4().hex}.part")
+        self.validator_path = self.path.with_suffix(".validator")
+        self.file = None
+        self.offset = 0
+        self.validator = None
+        self.digest = hashlib.sha256()
+        if self.shared and self.path.exists() and self.validator_path.exists():
+            self.validator = self.validator_path.read_text()
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_SIZE), b""):
+                    self.digest.update(chunk)
+                    self.offset += len(chunk)
+        else:
+            self.discard()
+
+    def headers(self) -> Dict[str, str]:
+        if not self.offset or self.validator is None:
+            return {}
+        return {"Range": f"bytes={self.offset}-", "If-Range": self.validator}
+
+    def begin(self, status: int, headers: Mapping[str, str]) -> None:
+        """Open the partial file to append to or rewrite, depending on the response."""
+        if status == 206 and self.offset and headers.get("Content-Range", "").startswith(f"bytes {self.offset}-"):
+            self.file = open(self.path, "ab")
+        elif status == 200:
+            self.discard()
+            self.validator = headers.get("ETag") or headers.get("Last-Modified")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.validator is not None:
+                self.validator_path.write_text(self.validator)
+            self.file = open(self.path, "wb")
+        elif status == 404:
+            self.discard()
+            raise DataNotFound(self.url)
+        elif status in (418, 429):
+            retry_after = headers.get("Retry-After")
+            raise RateLimited(
+                f"HTTP {status}: {self.url}",
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        else:
+            # the partial file doesn't match the remote file, resending its range can't succeed
+            if status in (206, 416):
+                self.discard()
+            raise NetworkError(f"HTTP {status}: {self.url}")
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.offset += len(chunk)
+
+    def pause(self, complete: bool = False) -> None:
+        """
+        Close the partial file after a transfer. A failed transfer is kept only if it can be
+        resumed, a ``complete`` one until it is parsed.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if not complete and self.validator is None:
+            self.discard()
+
+    def verify(self, expected: Optional[str]) -> str:
+        try:
+            verify_checksum(self.url, self.digest.hexdigest(), expected)
+        except ChecksumMismatch:
+            self.discard()
+            raise
+        return self.digest.hexdigest()
+
+    def keep_raw(self) -> None:
+        if config.SAVE_RAW:
+            with open(self.path, "rb") as f:
+                save_raw_data(self.url, f, self.digest.hexdigest())
+
+    def parse(self, data_type: str, data_tz: str) -> DataFrame:
+        checksum = self.digest.hexdigest()
+        try:
+            self.keep_raw()
+            df = parse_file(data_type, data_tz, self.path)
+        finally:
+            self.discard()
+        df.attrs["checksum"] = checksum
+        return df
+
+    async def parse_async(self, data_type: str, data_tz: str) -> DataFrame:
+        """Like ``parse``, in the decode pool of ``pipeline.get_executor``."""
+        checksum = self.digest.hexdigest()
+        try:
+            await asyncio.to_thread(self.keep_raw)
+            df = await decode(parse_file, data_type, data_tz, self.path)
+        finally:
+            self.discard()
+        df.attrs["checksum"] = checksum
+        return df
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+        self.validator_path.unlink(missing_ok=True)
+        self.offset = 0
+        self.validator = None
+        self.digest = hashlib.sha256()
+
+    def release(self) -> None:
+        """Unlock the partial file for other downloads, or drop it if it's this download's own."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if not self.shared:
+            self.discard()
+        elif self.lock is not None:
+            if fcntl is not None:
+                # removed while still locked, so nobody takes a lock on it that is already gone
+                self.lock_path.unlink(missing_ok=True)
+            self.lock.close()
+            self.lock = None
+
+    def __enter__(self) -> "PartialDownload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def download_timeout() -> httpx.Timeout:
+    """Give up on a transfer once no data arrived for ``config.DOWNLOAD_STALL_TIMEOUT`` seconds."""
+    return httpx.Timeout(30, read=config.DOWNLOAD_STALL_TIMEOUT)
+
+
+def download_timeout_async() -> aiohttp.ClientTimeout:
+    return aiohttp.ClientTimeout(
+        total=None, sock_connect=30, sock_read=config.DOWNLOAD_STALL_TIMEOUT
+    )
+
+
+def download_data(
+    data_type: str,
+    data_tz: str,
+    url: str,
+    max_retries: int = 3,
+    client: Optional[httpx.Client] = None,
+) -> DataFrame:
     assert data_type in [
         "klines",
         "aggTrades",
@@ -312,30 +766,37 @@ def download_data(data_type: str, data_tz: str, url: str) -> DataFrame:
         "metrics",
     ]
 
-    try:
-        resp = httpx.get(url)
-    except (httpx.TimeoutException, httpx.NetworkError) as e:
-        raise NetworkError(e)
-
-    if resp.status_code == 200:
-        pass
-    elif resp.status_code == 404:
-        raise DataNotFound(url)
-    else:
-        raise NetworkError(url)
-
-    if data_type == "klines":
-        return load_klines(data_tz, resp.content)
-    elif data_type == "aggTrades":
-        return load_agg_trades(data_tz, resp.content)
-    elif data_type == "bookTicker":
-        return load_book_ticker(data_tz, resp.content)
-    elif data_type == "fundingRate":
-        return load_funding_rate(data_tz, resp.content)
-    elif data_type == "trades":
-        return load_trades(data_tz, resp.content)
-    elif data_type == "metrics":
-        return load_metrics(data_tz, resp.content)
+    df = load_raw_data(data_type, data_tz, url)
+    if df is not None:
+        return df
+
+    with PartialDownload(url) as download:
+        # attempts in a row that received nothing, a transfer making progress is always resumed
+        failures = 0
+        while True:
+            offset = download.offset
+            try:
+                with (client or httpx).stream(
+                    "GET", url, headers=download.headers(), timeout=download_timeout()
+                ) as resp:
+                    download.begin(resp.status_code, resp.headers)
+                    try:
+                        for chunk in resp.iter_bytes(config.DOWNLOAD_CHUNK_SIZE):
+                            download.write(chunk)
+                    except BaseException:
+                        download.pause()
+                        raise
+                    download.pause(complete=True)
+                if config.VERIFY_CHECKSUM:
+                    download.verify(get_checksum(url, client))
+                break
+            except (httpx.TransportError, NetworkError) as e:
+                failures = 0 if download.offset > offset else failures + 1
+                if failures == max_retries:
+                    raise e if isinstance(e, NetworkError) else NetworkError(e)
+                time.sleep(max(2 ** failures, getattr(e, "retry_after", None) or 0))
+
+        return download.parse(data_type, data_tz)
 
 
 async def download_data_async(
@@ -344,7 +805,7 @@ async def download_data_async(
     url: str,
     max_retries: int = 3,
     session: aiohttp.ClientSession = None,
-    limiter: asynciolimiter.Limiter = None,
+    limiter: Union[AdaptiveLimiter, asynciolimiter.Limiter, None] = None,
 ) -> DataFrame:
     assert data_type in [
         "klines",
@@ -354,32 +815,90 @@ async def download_data_async(
         "trades",
         "metrics",
     ]
-    if limiter is not None:
-        await limiter.wait()
-    async def attempt_download():
-        try:
-            async with session.get(
-                url, timeout=aiohttp.ClientTimeout(total=30)
-            ) as resp:
-                if resp.status == 200:
-                    content = await resp.read()
-                    return content
-                elif resp.status == 404:
-                    raise DataNotFound(url)
-                else:
-                    raise NetworkError(f"HTTP {resp.status}: {url}")
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise NetworkError(str(e))
+    df = await asyncio.to_thread(load_raw_data, data_type, data_tz, url)
+    if df is not None:
+        return df
 
-    for attempt in range(max_retries):
+    async with reserve():
+        with PartialDownload(url) as download:
+            await download_async(download, session, limiter, max_retries)
+            return await download.parse_async(data_type, data_tz)
+
+
+async def download_async(
+    download: PartialDownload,
+    session: aiohttp.ClientSession,
+    limiter: Union[AdaptiveLimiter, asynciolimiter.Limiter, None],
+    max_retries: int = 3,
+) -> None:
+    url = download.url
+    failures = 0
+    while True:
+        offset = download.offset
         try:
-            content = await attempt_download()
+            async with acquire(limiter) as slot:
+                async with session.get(
+                    url, headers=download.headers(), timeout=download_timeout_async()
+                ) as resp:
+                    slot.responded()
+                    download.begin(resp.status, resp.headers)
+                    try:
+                        async for chunk in resp.content.iter_chunked(config.DOWNLOAD_CHUNK_SIZE):
+                            download.write(chunk)
+                    except BaseException:
+                        download.pause()
+                        raise
+                    download.pause(complete=True)
+                if config.VERIFY_CHECKSUM:
+                    download.verify(await get_checksum_async(url, session))
             break
-        except NetworkError:
-            if attempt == max_retries - 1:  # Last attempt
-                raise
-            await asyncio.sleep(2**attempt)  # Exponential backoff
+        except (aiohttp.ClientError, asyncio.TimeoutError, NetworkError) as e:
+            failures = 0 if download.offset > offset else failures + 1
+            if failures == max_retries:
+                raise e if isinstance(e, NetworkError) else NetworkError(str(e))
+            # Exponential backoff
+            await asyncio.sleep(max(2 ** failures, getattr(e, "retry_after", None) or 0))
+
+
+def parse_checksum(text: str) -> str:
+    """``'<sha256>  BTCUSDT-1m-2024-01.zip'`` -> ``'<sha256>'``"""
+    return text.split()[0].lower()
+
+
+def get_checksum(url: str, client: Optional[httpx.Client] = None) -> Optional[str]:
+    """The sha256 Binance publishes next to ``url``, or None if there is none."""
+    resp = (client or httpx).get(url + ".CHECKSUM")
+    if resp.status_code == 200:
+        return parse_checksum(resp.text)
+    elif resp.status_code == 404:
+        return None
+    else:
+        raise NetworkError(f"HTTP {resp.status_code}: {url}.CHECKSUM")
+
+
+async def get_checksum_async(url: str, session: aiohttp.ClientSession) -> Optional[str]:
+    async with session.get(
+        url + ".CHECKSUM", timeout=aiohttp.ClientTimeout(total=30)
+    ) as resp:
+        if resp.status == 200:
+            return parse_checksum(await resp.text())
+        elif resp.status == 404:
+            return None
+        else:
+            raise NetworkError(f"HTTP {resp.status}: {url}.CHECKSUM")
+
+
+def verify_checksum(url: str, actual: str, expected: Optional[str]) -> None:
+    if expected is not None and actual != expected:
+        raise ChecksumMismatch(f"{url}: expected sha256 {expected}, got {actual}")
+
+
+def parse_file(data_type: str, data_tz: str, path: Path) -> DataFrame:
+    with open(path, "rb") as f:
+        return parse_data(data_type, data_tz, f)
+
 
+def parse_data(data_type: str, data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
     if data_type == "klines":
         return load_klines(data_tz, content)
     elif data_type == "aggTrades":
@@ -394,144 +913,119 @@ async def download_data_async(
         return load_metrics(data_tz, content)
 
 
-def load_klines(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
-        csv_name = zipf.namelist()[0]
-        with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                usecols=range(12),
-                header=0,
-                names=[
-                    "open_time",
-                    "open",
-                    "high",
-                    "low",
-                    "close",
-                    "volume",
-                    "close_time",
-                    "quote_volume",
-                    "count",
-                    "taker_buy_volume",
-                    "taker_buy_quote_volume",
-                    "ignore",
-                ],
-            )
-            df["datetime"] = pd.to_datetime(
-                df.open_time, unit="ms", utc=True
-            ).dt.tz_convert(data_tz)
-            df.set_index("datetime", inplace=True)
-    return df
+def as_file(content: Union[bytes, IO[bytes]]) -> IO[bytes]:
+    """Wrap raw zip bytes in a file object, or rewind an already opened file."""
+    if isinstance(content, (bytes, bytearray)):
+        return io.BytesIO(content)
+    content.seek(0)
+    return content
 
 
-def load_agg_trades(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
-        csv_name = zipf.namelist()[0]
-        with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                header=0,
-                usecols=[0, 1, 2, 3, 4, 5, 6],
-                names=[
-                    "agg_trade_id",
-                    "price",
-                    "quantity",
-                    "first_trade_id",
-                    "last_trade_id",
-                    "transact_time",
-                    "is_buyer_maker",
-                ],
-            )
-            df["datetime"] = pd.to_datetime(
-                df.transact_time, unit="ms", utc=True
-            ).dt.tz_convert(data_tz)
-            df.set_index("datetime", inplace=True)
-    return df
+def sniff_csv(csvfile: IO[bytes]) -> Tuple[bool, int]:
+    """Return whether the csv starts with a header row and how many fields a row has."""
+    first = csvfile.readline()
+    csvfile.seek(0)
+    has_header = first.lstrip(b'\xef\xbb\xbf"')[:1].isalpha()
+    return has_header, first.count(b",") + 1
 
 
-def load_book_ticker(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
+def load_csv(data_type: str, data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    """
+    Parse the csv inside a Binance zip with the fixed schema of ``data_type`` from
+    ``constants.CSV_SCHEMAS``, using the multithreaded pyarrow reader unless
+    ``config.CSV_ENGINE`` is ``'pandas'``.
+    """
+    columns = CSV_SCHEMAS[data_type]
+    names = [name for name, _ in columns]
+
+    with zipfile.ZipFile(as_file(content)) as zipf:
         csv_name = zipf.namelist()[0]
         with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                header=0,
-                usecols=[0, 1, 2, 3, 4, 5, 6],
-                names=[
-                    "update_id",
-                    "bid_price",
-                    "bid_quantity",
-                    "ask_price",
-                    "ask_quantity",
-                    "transaction_time",
-                    "event_time",
-                ],
-            )
-            df["datetime"] = pd.to_datetime(
-                df.event_time, unit="ms", utc=True
-            ).dt.tz_convert(data_tz)
-            df.set_index("datetime", inplace=True)
+            has_header, n_fields = sniff_csv(csvfile)
+            all_names = names + [f"extra_{i}" for i in range(len(names), n_fields)]
+
+            if config.CSV_ENGINE == "pyarrow":
+                # decompress and parse block by block, so only CSV_BLOCK_SIZE bytes of
+                # csv text are held at a time next to the parsed columns
+                reader = pa_csv.open_csv(
+                    csvfile,
+                    read_options=pa_csv.ReadOptions(
+                        column_names=all_names,
+                        skip_rows=int(has_header),
+                        use_threads=True,
+                        block_size=config.CSV_BLOCK_SIZE,
+                    ),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types={name: pa.type_for_alias(t) for name, t in columns},
+                        include_columns=names,
+                    ),
+                )
+                table = reader.read_all()
+                # free each arrow column once it's converted instead of holding both copies
+                df = table.to_pandas(self_destruct=True, split_blocks=True)
+                del table
+            else:
+                df = pd.read_csv(
+                    csvfile,
+                    header=None,
+                    skiprows=int(has_header),
+                    names=all_names,
+                    usecols=names,
+                    dtype={name: t if t != "string" else object for name, t in columns},
+                )
+
+    time_column = TIME_COLUMNS[data_type]
+    if data_type == "metrics":
+        dt = pd.to_datetime(df[time_column], utc=True)
+    else:
+        dt = pd.to_datetime(df[time_column], unit="ms", utc=True)
+    df["datetime"] = dt.dt.tz_convert(data_tz)
+    df.set_index("datetime", inplace=True)
     return df
 
 
-def load_funding_rate(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
-        csv_name = zipf.namelist()[0]
-        with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                header=0,
-                usecols=[0, 1, 2],
-                names=["calc_time", "funding_interval_hours", "last_funding_rate"],
-            )
-            df["datetime"] = pd.to_datetime(
-                df.calc_time, unit="ms", utc=True
-            ).dt.tz_convert(data_tz)
-            df.set_index("datetime", inplace=True)
-    return df
+def load_klines(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("klines", data_tz, content)
 
 
-def load_trades(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
-        csv_name = zipf.namelist()[0]
-        with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                header=0,
-                usecols=[0, 1, 2, 3, 4, 5],
-                names=["id", "price", "qty", "base_qty", "time", "is_buyer_maker"],
-            )
-            df["datetime"] = pd.to_datetime(df.time, unit="ms", utc=True).dt.tz_convert(
-                data_tz
-            )
-            df.set_index("datetime", inplace=True)
-    return df
+def load_agg_trades(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("aggTrades", data_tz, content)
 
 
-def load_metrics(data_tz: str, content: bytes) -> DataFrame:
-    with zipfile.ZipFile(io.BytesIO(content)) as zipf:
-        csv_name = zipf.namelist()[0]
-        with zipf.open(csv_name, "r") as csvfile:
-            df = pd.read_csv(
-                csvfile,
-                header=0,
-                usecols=range(8),
-                names=[
-                    "create_time",
-                    "symbol",
-                    "sum_open_interest",
-                    "sum_open_interest_value",
-                    "count_toptrader_long_short_ratio",
-                    "sum_toptrader_long_short_ratio",
-                    "count_long_short_ratio",
-                    "sum_taker_long_short_vol_ratio",
-                ],
-            )
-            df["datetime"] = pd.to_datetime(df.create_time, utc=True).dt.tz_convert(
-                data_tz
-            )
-            df.set_index("datetime", inplace=True)
-    return df
+def load_book_ticker(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("bookTicker", data_tz, content)
+
+
+def load_funding_rate(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("fundingRate", data_tz, content)
+
+
+def load_trades(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("trades", data_tz, content)
+
+
+def load_metrics(data_tz: str, content: Union[bytes, IO[bytes]]) -> DataFrame:
+    return load_csv("metrics", data_tz, content)
+
+
+def compact_frame(data_type: str, df: DataFrame) -> DataFrame:
+    """
+    Shrink a loaded frame: drop the columns in ``constants.REDUNDANT_COLUMNS``, store floats as
+    float32, integers as int32 when every value fits, and strings as categoricals.
+    Note that float32 keeps about 7 significant digits.
+    """
+    df = df.drop(columns=REDUNDANT_COLUMNS[data_type], errors="ignore")
+    dtypes = {}
+    for name, dtype in df.dtypes.items():
+        if pd.api.types.is_float_dtype(dtype):
+            dtypes[name] = "float32"
+        elif pd.api.types.is_integer_dtype(dtype) and not df[name].empty:
+            info = np.iinfo(np.int32)
+            if info.min <= df[name].min() and df[name].max() <= info.max:
+                dtypes[name] = "int32"
+        elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            dtypes[name] = "category"
+    return df.astype(dtypes)
 
 
 def get_local_data_path(url: str) -> Path:
@@ -545,13 +1039,103 @@ def save_data_to_disk(url: str, df: DataFrame, save_local: bool = False) -> None
     path.parent.mkdir(parents=True, exist_ok=True)
     # df.to_pickle(path)
     if save_local and not os.path.exists(path):
-        df.to_parquet(path)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        data_type = parse_data_url(url).data_type
+        to_store_frame(data_type, df).to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        record_file(url, path, len(df), df.attrs.get("checksum"))
+        if config.CACHE_MAX_BYTES is not None:
+            evict(config.CACHE_MAX_BYTES, keep=path)
+
+
+def get_raw_path(checksum: str) -> Path:
+    return config.CACHE_DIR / "raw" / checksum[:2] / f"{checksum}.zip"
+
+
+def save_raw_data(url: str, content: IO[bytes], checksum: str) -> None:
+    """Keep the downloaded zip of ``url`` under ``config.CACHE_DIR / 'raw'``, named by its sha256."""
+    path = get_raw_path(checksum)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        content.seek(0)
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(content, f, config.DOWNLOAD_CHUNK_SIZE)
+        os.replace(tmp, path)
+    content.seek(0)
+    record_raw(url, checksum, path.stat().st_size)
+
+
+def load_raw_data(data_type: str, data_tz: str, url: str) -> Optional[DataFrame]:
+    """Parse the raw zip of ``url`` kept by ``save_raw_data``, or return None if there is none."""
+    checksum = lookup_raw(url)
+    if checksum is None:
+        return None
+
+    path = get_raw_path(checksum)
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_SIZE), b""):
+                digest.update(chunk)
+            if digest.hexdigest() != checksum:
+                raise ValueError(f"sha256 is {digest.hexdigest()}")
+            f.seek(0)
+            df = parse_data(data_type, data_tz, f)
+    except FileNotFoundError:
+        forget_raw(url)
+        return None
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        warnings.warn(f"Discarding corrupted raw file {path} ({e}), refetching {url}")
+        path.unlink(missing_ok=True)
+        forget_raw(url)
+        return None
 
+    df.attrs["checksum"] = checksum
+    return df
+
+
+def discard_corrupted(url: str, path: Path, reason) -> None:
+    warnings.warn(f"Discarding corrupted cache file {path} ({reason}), refetching {url}")
+    path.unlink(missing_ok=True)
+    forget_path(path)
+    record_miss()
 
-def load_data_from_disk(url: str) -> Union[DataFrame, None]:
+
+def load_data_from_disk(
+    url: str,
+    data_tz: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> Union[DataFrame, None]:
+    """
+    Read the cached rows of ``url``, only reading ``columns`` and the row groups
+    overlapping ``[start, end)`` when given.
+    """
     path = get_local_data_path(url)
-    if os.path.exists(path):
-        # return pd.read_pickle(path)
-        return pd.read_parquet(path)
-    else:
+    record = lookup_file(url)
+    if record is not None:
+        path = record.path
+    # unknown columns raise a ValueError before reading, only unreadable files are discarded
+    try:
+        if path.exists() and path == get_local_data_path(url):
+            rows = pq.read_metadata(path).num_rows
+            if record is not None and rows != record.rows:
+                return discard_corrupted(url, path, f"{rows} rows instead of {record.rows}")
+            # return pd.read_pickle(path)
+            df = read_parquet(path, parse_data_url(url).data_type, columns, start, end)
+        else:
+            df = read_data_file(url, columns, start, end)
+    except (OSError, pa.ArrowException) as e:
+        return discard_corrupted(url, path, e)
+
+    if df is None:
+        if record is not None:
+            forget_files([url])
+        record_miss()
         return None
+    touch_file(url)
+    if data_tz is not None:
+        df.index = df.index.tz_convert(data_tz)
+    return df
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from quantease_binance import config
+
+
+def make_zip(text: str, name: str = "data.csv") -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr(name, text)
+    return buf.getvalue()
+
+
+def make_klines_zip(start_ms: int, rows: int, step_ms: int = 60_000, name: str = "klines.csv") -> bytes:
+    lines = []
+    for i in range(rows):
+        t = start_ms + i * step_ms
+        price = 100 + i
+        lines.append(f"{t},{price},{price + 1},{price - 1},{price},1.5,{t + step_ms - 1},150.0,3,0.5,50.0,0")
+    return make_zip("\n".join(lines) + "\n", name)
+
+
+class DataServer:
+    """
+    A local stand-in for data.binance.vision serving ``files``. Range requests are honoured
+    while ``If-Range`` matches the ETag, the next response of a path in ``cut`` drops the
+    connection after that many bytes of the body, and ``statuses`` lists the error statuses
+    answered to the next requests of a path. Without ``etags`` responses carry no validator.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.cut = {}
+        self.statuses = {}
+        self.etags = True
+        self.requests = []
+        self.ranges = []
+        self.peers = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def serve(self, url: str, body: bytes) -> None:
+        self.files[urlparse(url).path] = body
+
+    def _handler(self):
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep connections alive
+
+            def _respond(self, body_wanted):
+                outer.requests.append((self.command, self.path))
+                outer.peers.add(self.client_address)
+                body = outer.files.get(self.path)
+                statuses = outer.statuses.get(self.path)
+                if statuses:
+                    self.send_response(statuses.pop(0))
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                range_ = self.headers.get("Range")
+                outer.ranges.append(range_)
+                if range_ and outer.etags and self.headers.get("If-Range") == etag:
+                    offset = int(range_[len("bytes="):].rstrip("-"))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}")
+                    body = body[offset:]
+                else:
+                    self.send_response(200)
+                if outer.etags:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not body_wanted:
+                    return
+                cut = outer.cut.pop(self.path, None)
+                if cut is not None:
+                    self.wfile.write(body[:cut])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def data_server(monkeypatch):
+    """A ``DataServer`` that ``config.DATA_URL`` points to."""
+    with DataServer() as server:
+        monkeypatch.setattr(config, "DATA_URL", server.url)
+        yield server
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    return tmp_path
@@ -1,9 +1,34 @@
+import asyncio
 import datetime
+import threading
+from urllib.parse import urlparse
 
+import aiohttp
+import numpy as np
+import pandas as pd
 import pytest
 from pandas import Timestamp, Timedelta
 
-from quantease_binance import fetch_klines, fetch_agg_trades
+from quantease_binance import (
+    AdaptiveLimiter,
+    SymbolType,
+    afetch_data,
+    afetch_klines,
+    api,
+    fetch_agg_trades,
+    fetch_data,
+    fetch_klines,
+    fetch_many,
+    fetch_panel,
+    iter_data,
+    sync,
+    sync_universe,
+    utils,
+)
+from quantease_binance.listing import FileIndex
+from quantease_binance.utils import Symbol
+from tests.conftest import make_klines_zip
+from tests.test_store import JAN, save
 
 
 @pytest.mark.parametrize(
@@ -124,3 +149,209 @@ def test_fetch_agg_trades_one_month(symbol, start, end, tz, asset_type):
 def test_wrong_datetime_type():
     with pytest.raises(TypeError):
         fetch_klines("btcusdt", 3, 4)
+
+
+def test_fetch_many_groups_by_symbol(monkeypatch):
+    def fake_gen_dates(data_type, asset_type, symbol, start, end, timeframe=None):
+        return [Timestamp("2022-1-1")], [Timestamp("2022-2-1")]
+
+    async def fake_get_data_async(data_type, asset_type, freq, symbol, dt, tz, *args):
+        index = pd.date_range(dt, periods=3, freq="D", tz=tz, name="datetime")
+        return pd.DataFrame({"close": [1.0, 2.0, 3.0]}, index=index)
+
+    monkeypatch.setattr(api, "gen_dates", fake_gen_dates)
+    monkeypatch.setattr(api, "get_data_async", fake_get_data_async)
+
+    dfs = fetch_many(
+        ["btcusdt", "ETH/USDT"],
+        "spot",
+        "klines",
+        "2022-1-2",
+        {"btcusdt": "2022-2-2", "ETH/USDT": "2022-2-3"},
+        timeframe="1d",
+    )
+    assert sorted(dfs) == ["BTCUSDT", "ETHUSDT"]
+    assert len(dfs["BTCUSDT"]) == 3
+    assert len(dfs["ETHUSDT"]) == 4
+
+    df = fetch_many(
+        ["BTCUSDT"], "spot", "klines", "2022-1-1", "2022-3-1", timeframe="1d", as_frame=True
+    )
+    assert (df.symbol == "BTCUSDT").all()
+    assert len(df) == 6
+
+
+def test_iter_data_prefetches_in_order(monkeypatch):
+    def fake_gen_dates(data_type, asset_type, symbol, start, end, timeframe=None):
+        return [Timestamp("2022-1-1"), Timestamp("2022-2-1")], [Timestamp("2022-3-1"), Timestamp("2022-3-2")]
+
+    lock = threading.Lock()
+    calls = []
+
+    def fake_get_data(data_type, asset_type, freq, symbol, dt, tz, *args):
+        with lock:
+            calls.append(dt)
+        periods = 3 if freq == "monthly" else 1
+        index = pd.date_range(dt, periods=periods, freq="D", tz=tz, name="datetime")
+        return pd.DataFrame({"close": range(periods)}, index=index)
+
+    monkeypatch.setattr(api, "gen_dates", fake_gen_dates)
+    monkeypatch.setattr(api, "get_data", fake_get_data)
+
+    chunks = iter_data("BTCUSDT", "spot", "klines", "2022-1-2", "2022-3-2", timeframe="1d", prefetch=1)
+    first = next(chunks)
+    assert len(first) == 2
+    assert len(calls) <= 3
+    rest = list(chunks)
+    assert [len(c) for c in rest] == [3, 1]
+    assert rest[-1].index[0] == Timestamp("2022-3-1", tz="UTC")
+
+    chunks = list(
+        iter_data("BTCUSDT", "spot", "klines", "2022-1-1", "2022-3-3", timeframe="1d", chunksize=2)
+    )
+    assert [len(c) for c in chunks] == [2, 1, 2, 1, 1, 1]
+
+
+@pytest.mark.parametrize("max_workers", [None, 3])
+def test_fetch_data_pools_connections(monkeypatch, cache_dir, data_server, max_workers):
+    days = [Timestamp("2022-3-1") + Timedelta(days=d) for d in range(6)]
+    for day in days:
+        url = utils.gen_data_url("klines", "spot", "daily", "BTCUSDT", day, "1m")
+        data_server.serve(url, make_klines_zip(day.value // 10**6, 1440))
+
+    monkeypatch.setattr(api, "gen_dates", lambda *args, **kwargs: ([], days))
+
+    df = fetch_data(
+        "BTCUSDT", "spot", "klines", "2022-3-1", "2022-3-7", timeframe="1m", max_workers=max_workers
+    )
+    assert len(df) == 6 * 1440
+    assert df.index.is_monotonic_increasing
+    # every file and checksum went through the connections kept alive by one client
+    assert len(data_server.requests) == 12
+    assert len(data_server.peers) <= (max_workers or 1)
+
+
+def test_afetch_on_running_loop(monkeypatch, cache_dir, data_server):
+    day = Timestamp("2022-3-1")
+    for symbol in ("BTCUSDT", "ETHUSDT"):
+        url = utils.gen_data_url("klines", "spot", "daily", symbol, day, "1m")
+        data_server.serve(url, make_klines_zip(day.value // 10**6, 1440))
+
+    monkeypatch.setattr(api, "gen_dates", lambda *args, **kwargs: ([], [day]))
+
+    async def main():
+        limiter = AdaptiveLimiter(max_concurrency=4)
+        async with aiohttp.ClientSession() as session:
+            btc, eth = await asyncio.gather(
+                afetch_klines("BTCUSDT", "2022-3-1", "2022-3-1 12:00", tz="UTC", session=session, limiter=limiter),
+                afetch_data(
+                    "ETHUSDT", "spot", "klines", "2022-3-1", "2022-3-2", timeframe="1m", columns=["close"],
+                    session=session, limiter=limiter,
+                ),
+            )
+            assert not session.closed
+        assert limiter.successes == 2
+        return btc, eth
+
+    btc, eth = asyncio.run(main())
+    assert len(btc) == 720
+    assert list(eth.columns) == ["close"] and len(eth) == 1440
+
+
+def test_fetch_panel(monkeypatch, cache_dir, data_server):
+    days = [Timestamp("2022-3-1"), Timestamp("2022-3-2")]
+    for symbol, day, rows in [("BTCUSDT", days[0], 1440), ("BTCUSDT", days[1], 1440), ("ETHUSDT", days[0], 720)]:
+        url = utils.gen_data_url("klines", "spot", "daily", symbol, day, "1m")
+        data_server.serve(url, make_klines_zip(day.value // 10**6, rows))
+
+    monkeypatch.setattr(api, "gen_dates", lambda *args, **kwargs: ([], days))
+
+    with pytest.warns(UserWarning, match="No data found for XRPUSDT"):
+        panel = fetch_panel(["BTCUSDT", "eth/usdt", "XRPUSDT"], "2022-3-1 06:00", "2022-3-2 06:00", tz="UTC")
+    assert list(panel.columns) == ["BTCUSDT", "ETHUSDT", "XRPUSDT"]
+    assert len(panel) == 1440 and panel.index[0] == Timestamp("2022-3-1 06:00", tz="UTC")
+    assert panel["BTCUSDT"].notna().all()
+    assert panel.loc["2022-3-1 06:00", "BTCUSDT"] == 100 + 360
+    assert panel.loc["2022-3-2 05:59", "BTCUSDT"] == 100 + 359
+    # ETHUSDT has klines until 12:00 only
+    assert panel["ETHUSDT"].notna().sum() == 360
+    assert panel["XRPUSDT"].isna().all()
+    assert panel.dtypes.unique().tolist() == [np.float64]
+
+
+def test_sync_from_high_water_mark(monkeypatch, cache_dir, data_server):
+    save("monthly", "2022-01", JAN, 31 * 1440, "UTC")
+    feb = utils.gen_data_url("klines", "spot", "monthly", "BTCUSDT", Timestamp("2022-2-1"), "1m")
+    days = [Timestamp("2022-3-1"), Timestamp("2022-3-2")]
+    urls = [feb] + [utils.gen_data_url("klines", "spot", "daily", "BTCUSDT", day, "1m") for day in days]
+    for url, dt in zip(urls, [Timestamp("2022-2-1")] + days):
+        data_server.serve(url, make_klines_zip(dt.value // 10**6, 10))
+
+    index = FileIndex(
+        monthly={Timestamp("2022-1-1"): None, Timestamp("2022-2-1"): None}, daily=dict.fromkeys(days)
+    )
+    monkeypatch.setattr(utils, "get_file_index", lambda *args: index)
+
+    synced = sync("BTCUSDT", "klines", timeframe="1m", end="2022-3-3")
+    assert synced == urls
+    assert sorted(path for _, path in data_server.requests if path.endswith(".zip")) == sorted(
+        urlparse(url).path for url in urls
+    )
+
+    # the synced files are found in the manifest by the next plan
+    data_server.requests.clear()
+    assert sync("BTCUSDT", "klines", timeframe="1m", end="2022-3-3") == []
+    assert data_server.requests == []
+    with pytest.raises(ValueError):
+        sync("ETHUSDT", "klines", timeframe="1m")
+
+
+def test_sync_universe(monkeypatch, cache_dir, data_server):
+    days = [Timestamp("2022-3-1"), Timestamp("2022-3-2")]
+    urls = [utils.gen_data_url("klines", "spot", "daily", "BTCUSDT", day, "1m") for day in days]
+    for url, dt in zip(urls, days):
+        data_server.serve(url, make_klines_zip(dt.value // 10**6, 10))
+
+    monkeypatch.setattr(utils, "get_file_index", lambda *args: FileIndex(daily=dict.fromkeys(days)))
+    now = Timestamp.now(tz="UTC")
+    monkeypatch.setattr(
+        api,
+        "fetch_all_symbols",
+        lambda asset_type, source: {
+            "BTCUSDT": Symbol("BTCUSDT", SymbolType.PERP, Timestamp("2022-3-1", tz="UTC"), now),
+            "ETHUSDT": Symbol("ETHUSDT", SymbolType.FUTURE, Timestamp("2022-3-1", tz="UTC"), now),
+            "XRPUSDT": Symbol(
+                "XRPUSDT", SymbolType.PERP, Timestamp("2022-3-1", tz="UTC"), Timestamp("2022-3-1 12:00", tz="UTC")
+            ),
+        },
+    )
+
+    report = sync_universe("spot", "klines", timeframe="1m", symbol_type=SymbolType.PERP, end="2022-3-3")
+    assert list(report["symbol"]) == ["BTCUSDT", "XRPUSDT"]
+    btc, xrp = report.to_dict("records")
+    assert (btc["planned"], btc["cached"], btc["not_found"], btc["failed"]) == (2, 2, 0, 0)
+    assert xrp["end"] == Timestamp("2022-3-2", tz="UTC")
+    assert (xrp["planned"], xrp["cached"], xrp["not_found"], xrp["failed"]) == (1, 0, 1, 0)
+
+    data_server.requests.clear()
+    report = sync_universe("spot", "klines", timeframe="1m", active=True, end="2022-3-3")
+    assert list(report["symbol"]) == ["BTCUSDT", "ETHUSDT"]
+    assert list(report["planned"]) == [0, 2]
+    assert list(report["not_found"]) == [0, 2]
+    assert not any(path.endswith("BTCUSDT-1m-2022-03-01.zip") for _, path in data_server.requests)
+
+    # an explicit start before the listing is clamped to it
+    report = sync_universe(
+        "spot", "klines", timeframe="1m", where=lambda i: i.id == "ETHUSDT", start="2022-2-1", end="2022-3-3"
+    )
+    assert report.loc[0, "start"] == Timestamp("2022-3-1", tz="UTC")
+
+    # a corrupt file is reported as failed while the others are still synced
+    day = Timestamp("2022-3-3")
+    monkeypatch.setattr(utils, "get_file_index", lambda *args: FileIndex(daily=dict.fromkeys(days + [day])))
+    data_server.serve(utils.gen_data_url("klines", "spot", "daily", "BTCUSDT", day, "1m"), b"not a zip")
+    report = sync_universe("spot", "klines", timeframe="1m", where=lambda i: i.id == "BTCUSDT", end="2022-3-4")
+    btc = report.loc[0]
+    assert btc["start"] == Timestamp("2022-3-3", tz="UTC")  # from the high-water mark
+    assert (btc["planned"], btc["cached"], btc["not_found"], btc["failed"]) == (1, 0, 0, 1)
+    assert btc["error"] == "File is not a zip file"
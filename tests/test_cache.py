@@ -0,0 +1,93 @@
+from pandas import Timestamp
+
+from quantease_binance import cache, cache_stats, compact_store, config, evict_cache, promote_daily_files, utils
+from quantease_binance.manifest import read_promotions
+from quantease_binance.memory import memory_cache
+from quantease_binance.utils import gen_data_url, get_local_data_path, load_data_from_disk, load_klines
+from tests.conftest import make_klines_zip
+from tests.test_store import DAY, MAR, save
+
+FEB = 1643673600000  # 2022-02-01 UTC
+
+
+def test_promote_daily_files(cache_dir, monkeypatch):
+    downloads = []
+
+    def fake_download_data(data_type, data_tz, url):
+        downloads.append(url)
+        start = FEB if "2022-02" in url else MAR
+        return load_klines(data_tz, make_klines_zip(start, 28 * 1440))
+
+    monkeypatch.setattr(cache, "download_data", fake_download_data)
+    monkeypatch.setattr(cache, "probe_months", lambda urls: {url: "2022-04" not in url for url in urls})
+
+    feb_days = [save("daily", f"2022-02-0{d + 1}", FEB + d * DAY, 1440, "UTC") for d in range(2)]
+    mar_days = [save("daily", f"2022-03-0{d + 1}", MAR + d * DAY, 1440, "UTC") for d in range(2)]
+    compact_store("BTCUSDT", "spot", "klines", "1m")  # February and March now live in the store
+    feb_days.append(save("daily", "2022-02-03", FEB + 2 * DAY, 1440, "UTC"))
+    save("daily", "2022-04-01", MAR + 31 * DAY, 1440, "UTC")  # monthly not published yet
+
+    feb = gen_data_url("klines", "spot", "monthly", "BTCUSDT", Timestamp("2022-02"), "1m")
+    mar = gen_data_url("klines", "spot", "monthly", "BTCUSDT", Timestamp("2022-03"), "1m")
+    assert sorted(promote_daily_files(asset_type="spot")) == [feb, mar]
+    assert sorted(downloads) == [feb, mar]
+
+    remaining = [p.name for p in (cache_dir / "data").rglob("*.parquet")]
+    assert remaining == ["BTCUSDT-1m-2022-04-01.parquet"]
+    assert len(load_data_from_disk(feb)) == 28 * 1440
+    assert len(load_data_from_disk(mar)) == 28 * 1440
+    assert load_data_from_disk(mar_days[0]) is not None  # served from the promoted partition
+
+    promotions = read_promotions()
+    assert sorted(promotions.monthly_url) == [feb, mar]
+    assert sorted(promotions.set_index("monthly_url").daily_urls[feb]) == sorted(feb_days)
+
+    assert promote_daily_files() == []
+
+
+def test_evict_least_recently_read(cache_dir, monkeypatch):
+    days = [save("daily", f"2022-03-0{d + 1}", MAR + d * DAY, 1440, "UTC") for d in range(3)]
+    size = get_local_data_path(days[0]).stat().st_size
+    assert load_data_from_disk(days[0]) is not None
+    assert load_data_from_disk(days[2].replace("03-03", "03-09")) is None
+
+    monkeypatch.setattr(config, "CACHE_MAX_BYTES", int(3.5 * size))
+    save("daily", "2022-03-04", MAR + 3 * DAY, 1440, "UTC")
+    assert not get_local_data_path(days[1]).exists()
+    assert get_local_data_path(days[0]).exists()
+
+    stats = cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+    assert stats["files"] == 3 and stats["evictions"] == 1
+
+    monkeypatch.setattr(config, "CACHE_PINNED", [("BTCUSDT", "klines")])
+    assert evict_cache(0) == []
+    monkeypatch.setattr(config, "CACHE_PINNED", [(None, "trades")])
+    assert len(evict_cache(0)) == 3
+    assert cache_stats()["bytes"] == 0
+
+
+def test_memory_cache(cache_dir, monkeypatch):
+    monkeypatch.setattr(config, "MEMORY_CACHE_BYTES", 64 * 1024 * 1024)
+    memory_cache.clear()
+    save("daily", "2022-03-01", MAR, 1440, "UTC")
+    args = ("klines", "spot", "daily", "BTCUSDT", Timestamp("2022-03-01"))
+
+    df = utils.get_data(*args, "UTC", "1m", True)
+    assert len(df) == 1440
+    df["close"] = 0.0  # callers get their own copy
+
+    def no_disk(*args):
+        raise AssertionError("read from disk")
+
+    monkeypatch.setattr(utils, "load_data_from_disk", no_disk)
+    df = utils.get_data(*args, "Asia/Shanghai", "1m", True, ["close"], Timestamp("2022-03-01 12:00", tz="UTC"))
+    assert list(df.columns) == ["close"]
+    assert len(df) == 720 and (df.close > 0).all()
+    assert str(df.index.tz) == "Asia/Shanghai"
+    assert cache_stats()["memory"]["hits"] == 1
+
+    monkeypatch.setattr(config, "MEMORY_CACHE_BYTES", memory_cache.size // 2)
+    memory_cache.put("other", df)
+    assert memory_cache.get(gen_data_url(*args[:4], args[4], "1m")) is None
+    memory_cache.clear()
@@ -0,0 +1,106 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from pandas import Timestamp
+
+from quantease_binance import config, listing
+from quantease_binance.exceptions import NetworkError
+from quantease_binance.listing import get_file_index
+from quantease_binance.utils import gen_dates
+
+MONTHLY = "data/spot/monthly/klines/BTCUSDT/1m/"
+DAILY = "data/spot/daily/klines/BTCUSDT/1m/"
+
+
+def contents(prefix, names):
+    return "".join(
+        f"<Contents><Key>{prefix}{name}</Key><LastModified>2022-04-01T00:00:00.000Z</LastModified>"
+        f'<ETag>"abc"</ETag><Size>{len(name)}</Size></Contents>'
+        for name in names
+    )
+
+
+def page(prefix, body, truncated=False):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+        f"<Prefix>{prefix}</Prefix><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+        f"{body}</ListBucketResult>"
+    )
+
+
+LISTINGS = {
+    (MONTHLY, ""): page(
+        MONTHLY,
+        contents(MONTHLY, ["BTCUSDT-1m-2022-01.zip", "BTCUSDT-1m-2022-01.zip.CHECKSUM"]),
+        truncated=True,
+    ),
+    (MONTHLY, MONTHLY + "BTCUSDT-1m-2022-01.zip.CHECKSUM"): page(
+        MONTHLY, contents(MONTHLY, ["BTCUSDT-1m-2022-02.zip"])
+    ),
+    (DAILY, ""): page(
+        DAILY,
+        contents(DAILY, [f"BTCUSDT-1m-2022-03-0{d}.zip" for d in range(1, 4)]),
+    ),
+}
+
+
+@pytest.fixture
+def bucket(monkeypatch, tmp_path):
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            key = (query["prefix"][0], query.get("marker", [""])[0])
+            requests.append(key)
+            body = LISTINGS.get(key, page(key[0], "")).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "LISTING_URL", f"http://127.0.0.1:{server.server_port}/")
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(listing, "_listings", {})
+    yield requests
+    server.shutdown()
+
+
+def test_file_index(bucket):
+    index = get_file_index(MONTHLY, DAILY)
+    assert list(index.monthly) == [Timestamp("2022-01"), Timestamp("2022-02")]
+    assert index.monthly[Timestamp("2022-01")].checksum_key.endswith(".CHECKSUM")
+    assert index.monthly[Timestamp("2022-02")].checksum_key is None
+    assert index.monthly[Timestamp("2022-02")].size == len("BTCUSDT-1m-2022-02.zip")
+    assert len(index.daily) == 3
+    assert len(bucket) == 3
+
+    # served from the in-process and then the on-disk cache
+    get_file_index(MONTHLY, DAILY)
+    listing._listings.clear()
+    get_file_index(MONTHLY, DAILY)
+    assert len(bucket) == 3
+
+
+def test_gen_dates_from_listing(bucket):
+    with pytest.warns(UserWarning, match="2021-11 to 2021-12"):
+        months, days = gen_dates(
+            "klines", "spot", "BTCUSDT", Timestamp("2021-11-5"), Timestamp("2022-3-2 12:00"), "1m"
+        )
+    assert months == [Timestamp("2022-01"), Timestamp("2022-02")]
+    assert days == [Timestamp("2022-03-01"), Timestamp("2022-03-02")]
+
+
+def test_unreadable_listing(bucket, monkeypatch):
+    monkeypatch.setitem(LISTINGS, (MONTHLY, ""), "<html><body>502 Bad Gateway")
+    with pytest.raises(NetworkError):
+        listing.list_bucket(MONTHLY)
@@ -0,0 +1,110 @@
+import hashlib
+
+import pytest
+from pandas import Timestamp
+
+from quantease_binance import compact_store, config, utils
+from quantease_binance.exceptions import ChecksumMismatch, DataNotFound
+from quantease_binance.listing import FileIndex
+from quantease_binance.manifest import coverage, lookup_file, lookup_files
+from quantease_binance.utils import download_data, gen_dates, get_local_data_path, get_raw_path, load_data_from_disk, save_data_to_disk
+from tests.conftest import make_klines_zip
+from tests.test_store import DAY, JAN, save
+
+NAME = "/data/spot/monthly/klines/BTCUSDT/1m/BTCUSDT-1m-2022-01.zip"
+
+
+def test_download_verifies_checksum(cache_dir, data_server, monkeypatch):
+    monkeypatch.setattr(utils.time, "sleep", lambda seconds: None)
+    content = make_klines_zip(JAN, 100)
+    sha256 = hashlib.sha256(content).hexdigest()
+    url = data_server.url + NAME
+    data_server.files[NAME] = content
+
+    data_server.files[NAME + ".CHECKSUM"] = f"{'0' * 64}  BTCUSDT-1m-2022-01.zip\n".encode()
+    with pytest.raises(ChecksumMismatch):
+        download_data("klines", "UTC", url)
+
+    data_server.files[NAME + ".CHECKSUM"] = f"{sha256}  BTCUSDT-1m-2022-01.zip\n".encode()
+    df = download_data("klines", "UTC", url)
+    save_data_to_disk(url, df, save_local=True)
+    record = lookup_file(url)
+    assert record.checksum == sha256
+    assert record.rows == 100
+    assert record.period_start == Timestamp("2022-1-1", tz="UTC")
+    assert record.path == get_local_data_path(url)
+
+
+def test_corrupted_file_is_refetched(cache_dir):
+    url = save("monthly", "2022-01", JAN, 1000, "UTC")
+    path = get_local_data_path(url)
+    path.write_bytes(path.read_bytes()[:100])
+
+    with pytest.warns(UserWarning, match="corrupted"):
+        assert load_data_from_disk(url) is None
+    assert not path.exists()
+    assert lookup_file(url) is None
+
+
+def test_unknown_column_keeps_cache(cache_dir):
+    url = save("monthly", "2022-01", JAN, 1000, "UTC")
+    with pytest.raises(ValueError, match="clsoe"):
+        load_data_from_disk(url, columns=["clsoe"])
+    assert lookup_file(url).path.exists()
+
+    compact_store("BTCUSDT", "spot", "klines", "1m")
+    with pytest.raises(ValueError, match="clsoe"):
+        load_data_from_disk(url, columns=["close", "clsoe"])
+    assert lookup_file(url).path.exists()
+
+
+def test_compaction_moves_records(cache_dir):
+    urls = [save("monthly", "2022-01", JAN, 1000, "UTC"), save("daily", "2022-02-01", JAN + 31 * DAY, 1440, "UTC")]
+    compact_store("BTCUSDT", "spot", "klines", "1m")
+
+    records = lookup_files(urls + ["missing"])
+    assert sorted(records) == sorted(urls)
+    assert all("store" in record.path.parts for record in records.values())
+    assert len(load_data_from_disk(urls[1])) == 1440
+
+    df = coverage("spot", "klines", "BTCUSDT", "1m")
+    assert df.freq.tolist() == ["monthly", "daily"]
+    assert df.rows.tolist() == [1000, 1440]
+
+
+def test_plan_from_manifest(cache_dir, monkeypatch):
+    save("monthly", "2022-01", JAN, 31 * 1440, "UTC")
+    save("daily", "2022-02-01", JAN + 31 * DAY, 1440, "UTC")
+
+    def offline(*args):
+        raise AssertionError("the bucket should not be listed")
+
+    monkeypatch.setattr(utils, "get_file_index", offline)
+    months, days = gen_dates("klines", "spot", "BTCUSDT", Timestamp("2022-1-5"), Timestamp("2022-2-1 12:00"), "1m")
+    assert months == [Timestamp("2022-1-1")]
+    assert days == [Timestamp("2022-2-1")]
+
+    monkeypatch.setattr(utils, "get_file_index", lambda *args: FileIndex())
+    with pytest.warns(UserWarning, match="does not exist"):
+        gen_dates("klines", "spot", "BTCUSDT", Timestamp("2022-1-5"), Timestamp("2022-2-3"), "1m")
+
+
+def test_raw_zip_cache(cache_dir, data_server, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_RAW", True)
+    content = make_klines_zip(JAN, 100)
+    url = data_server.url + NAME
+    data_server.files[NAME] = content
+
+    assert str(download_data("klines", "UTC", url).index.tz) == "UTC"
+    path = get_raw_path(hashlib.sha256(content).hexdigest())
+    assert path.read_bytes() == content
+
+    del data_server.files[NAME]
+    df = download_data("klines", "Asia/Shanghai", url)
+    assert len(df) == 100
+    assert str(df.index.tz) == "Asia/Shanghai"
+
+    path.write_bytes(content[:-10])
+    with pytest.warns(UserWarning, match="corrupted raw"), pytest.raises(DataNotFound):
+        download_data("klines", "UTC", url)
+    assert not path.exists()
@@ -0,0 +1,101 @@
+import pyarrow.parquet as pq
+from pandas import Timedelta, Timestamp
+
+from quantease_binance import api, compact_store, config, fetch_data, read_store
+from quantease_binance.utils import gen_data_url, get_local_data_path, load_data_from_disk, load_klines, save_data_to_disk
+from tests.conftest import make_klines_zip
+
+JAN = 1640995200000  # 2022-01-01 UTC
+MAR = 1646092800000  # 2022-03-01 UTC
+DAY = 24 * 60 * 60 * 1000
+
+
+def save(freq, dt, start_ms, rows, tz):
+    url = gen_data_url("klines", "spot", freq, "BTCUSDT", Timestamp(dt), timeframe="1m")
+    save_data_to_disk(url, load_klines(tz, make_klines_zip(start_ms, rows)), save_local=True)
+    return url
+
+
+def test_compact_store(cache_dir, monkeypatch):
+    monkeypatch.setattr(config, "STORE_ROW_GROUP_SIZE", 1000)
+    jan = save("monthly", "2022-01", JAN, 31 * 1440, "Asia/Shanghai")
+    days = [save("daily", f"2022-03-0{d + 1}", MAR + d * DAY, 1440, "UTC") for d in range(3)]
+
+    assert compact_store("btcusdt", "spot", "klines", "1m") == 2
+    assert not list((cache_dir / "data").rglob("*.parquet"))
+    partitions = sorted((cache_dir / "store").rglob("*.parquet"))
+    assert [p.parent.name for p in partitions] == ["month=01", "month=03"]
+    assert pq.ParquetFile(partitions[0]).num_row_groups > 1
+
+    df = load_data_from_disk(jan, "Asia/Shanghai")
+    assert len(df) == 31 * 1440
+    assert str(df.index.tz) == "Asia/Shanghai"
+    df = load_data_from_disk(days[1], "UTC")
+    assert df.index[0] == Timestamp("2022-3-2", tz="UTC")
+    assert len(df) == 1440
+    assert load_data_from_disk(gen_data_url("klines", "spot", "daily", "BTCUSDT", Timestamp("2022-3-4"), "1m")) is None
+
+    # compacting again merges new files into the existing partition without duplicates
+    save("daily", "2022-03-03", MAR + 2 * DAY, 1440, "UTC")
+    save("daily", "2022-03-04", MAR + 3 * DAY, 1440, "UTC")
+    assert compact_store("BTCUSDT", "spot", "klines", "1m") == 1
+
+    df = read_store(
+        "BTCUSDT", "spot", "klines",
+        Timestamp("2022-1-31 12:00", tz="UTC"), Timestamp("2022-3-3", tz="UTC"), "1m", columns=["close"],
+    )
+    assert list(df.columns) == ["close"]
+    assert len(df) == 12 * 60 + 2 * 1440
+    assert df.index.is_monotonic_increasing
+    assert len(read_store("BTCUSDT", "spot", "klines", timeframe="1m")) == 31 * 1440 + 4 * 1440
+
+
+def test_load_data_from_disk_pushdown(cache_dir):
+    url = save("monthly", "2022-01", JAN, 31 * 1440, "Asia/Shanghai")
+    start = Timestamp("2022-1-8", tz="Asia/Shanghai")
+    df = load_data_from_disk(url, "UTC", ["close"], start, start + Timedelta(days=7))
+    assert list(df.columns) == ["close"]
+    assert len(df) == 7 * 1440
+    assert df.index[0] == start
+    assert str(df.index.tz) == "UTC"
+
+
+def test_fetch_data_columns_from_cache(cache_dir, monkeypatch):
+    save("monthly", "2022-01", JAN, 31 * 1440, "UTC")
+    monkeypatch.setattr(api, "gen_dates", lambda *args, **kwargs: ([Timestamp("2022-01")], []))
+    df = fetch_data(
+        "BTCUSDT", "spot", "klines", "2022-1-8", "2022-1-15", tz="Asia/Shanghai", timeframe="1m",
+        columns=["close", "volume"],
+    )
+    assert list(df.columns) == ["close", "volume"]
+    assert len(df) == 7 * 1440
+    assert df.index[0] == Timestamp("2022-1-8", tz="Asia/Shanghai")
+
+
+def test_cache_is_timezone_independent(cache_dir):
+    shanghai = save("monthly", "2022-01", JAN, 1000, "Asia/Shanghai")
+    utc = save("monthly", "2022-02", JAN + 31 * DAY, 1000, "UTC")
+    schemas = [pq.read_schema(get_local_data_path(url)) for url in (shanghai, utc)]
+    assert schemas[0].names == schemas[1].names
+    assert "datetime" not in schemas[0].names
+    assert str(schemas[0].field("open_time").type) == "int64"
+
+    df = load_data_from_disk(shanghai, "America/New_York")
+    assert df.index[0] == Timestamp("2022-1-1", tz="UTC")
+    assert str(df.index.tz) == "America/New_York"
+
+
+def test_load_legacy_cache_file(cache_dir):
+    url = gen_data_url("klines", "spot", "monthly", "BTCUSDT", Timestamp("2022-01"), timeframe="1m")
+    path = get_local_data_path(url)
+    path.parent.mkdir(parents=True)
+    load_klines("Asia/Shanghai", make_klines_zip(JAN, 1000)).to_parquet(path)
+
+    start = Timestamp("2022-1-1 01:00", tz="UTC")
+    df = load_data_from_disk(url, "UTC", ["close"], start)
+    assert list(df.columns) == ["close"]
+    assert len(df) == 940
+    assert df.index[0] == start
+
+    compact_store("BTCUSDT", "spot", "klines", "1m")
+    assert len(read_store("BTCUSDT", "spot", "klines", timeframe="1m")) == 1000
@@ -0,0 +1,96 @@
+import aiohttp
+import pytest
+
+from pandas import Timestamp
+
+from quantease_binance import SymbolType, config, fetch_all_symbols, fetch_symbol_table, symbols
+from tests.test_listing import LISTINGS, bucket, contents, page
+
+DETAILS = {
+    "datasets": {
+        "symbols": [
+            {"id": "PERPETUALS", "type": "perpetual", "availableSince": "2019-11-17T00:00:00.000Z", "availableTo": "2099-01-01T00:00:00.000Z"},
+            {"id": "BTCUSDT", "type": "perpetual", "availableSince": "2019-11-17T00:00:00.000Z", "availableTo": "2099-01-01T00:00:00.000Z"},
+            {"id": "LUNAUSDT", "type": "perpetual", "availableSince": "2021-01-01T00:00:00.000Z", "availableTo": "2022-05-12T00:00:00.000Z"},
+        ]
+    }
+}
+
+
+def test_cached_symbols(monkeypatch, cache_dir):
+    calls = []
+
+    def fake_details(exchange):
+        calls.append(exchange)
+        return DETAILS
+
+    monkeypatch.setattr(symbols, "get_exchange_details", fake_details)
+
+    info = fetch_all_symbols("futures/um")
+    assert list(info) == ["BTCUSDT", "LUNAUSDT"]
+    assert info["BTCUSDT"].type == SymbolType.PERP and not info["LUNAUSDT"].active
+    assert fetch_all_symbols("futures/um") == info
+    assert calls == ["binance-futures"]
+
+    symbols._tables.clear()
+    table = fetch_symbol_table("futures/um")  # served from disk
+    assert calls == ["binance-futures"]
+    assert list(table.columns) == ["type", "availableSince", "availableTo", "active"]
+    assert list(table.index[table["active"]]) == ["BTCUSDT"]
+    assert str(table["availableSince"].dtype) == "datetime64[ns, UTC]"
+
+    fetch_all_symbols("futures/um", refresh=True)
+    assert len(calls) == 2
+
+    def offline(exchange):
+        raise aiohttp.ClientConnectionError()
+
+    monkeypatch.setattr(symbols, "get_exchange_details", offline)
+    monkeypatch.setattr(config, "SYMBOLS_TTL", 0)
+    with pytest.warns(UserWarning, match="stale"):
+        assert fetch_all_symbols("futures/um") == info
+    with pytest.raises(symbols.NetworkError):
+        fetch_all_symbols("spot")
+
+
+def test_symbols_from_bucket(monkeypatch, bucket):
+    def prefixes(prefix, names):
+        return "".join(f"<CommonPrefixes><Prefix>{prefix}{name}/</Prefix></CommonPrefixes>" for name in names)
+
+    listings = {
+        "data/futures/um/monthly/klines/": page("", prefixes("data/futures/um/monthly/klines/", ["BTCUSDT"])),
+        "data/futures/um/daily/klines/": page(
+            "", prefixes("data/futures/um/daily/klines/", ["BTCUSDT", "ETHUSDT_240329"])
+        ),
+        "data/futures/um/monthly/klines/BTCUSDT/1d/": page(
+            "", contents("data/futures/um/monthly/klines/BTCUSDT/1d/", ["BTCUSDT-1d-2020-01.zip"])
+        ),
+        "data/futures/um/daily/klines/BTCUSDT/1d/": page(
+            "", contents("data/futures/um/daily/klines/BTCUSDT/1d/", ["BTCUSDT-1d-2020-02-01.zip"])
+        ),
+        "data/futures/um/daily/klines/ETHUSDT_240329/1d/": page(
+            "",
+            contents(
+                "data/futures/um/daily/klines/ETHUSDT_240329/1d/",
+                ["ETHUSDT_240329-1d-2024-01-05.zip", "ETHUSDT_240329-1d-2024-03-29.zip"],
+            ),
+        ),
+    }
+    for prefix, body in listings.items():
+        monkeypatch.setitem(LISTINGS, (prefix, ""), body)
+    monkeypatch.setattr(symbols, "_tables", {})
+
+    info = fetch_all_symbols("futures/um", source="bucket")
+    assert info["BTCUSDT"].type == SymbolType.PERP
+    assert info["BTCUSDT"].availableSince == Timestamp("2020-01-01", tz="UTC")
+    assert info["BTCUSDT"].availableTo == Timestamp("2020-02-02", tz="UTC")
+    assert info["ETHUSDT_240329"].type == SymbolType.FUTURE
+    assert info["ETHUSDT_240329"].availableSince == Timestamp("2024-01-05", tz="UTC")
+    assert info["ETHUSDT_240329"].availableTo == Timestamp("2024-03-30", tz="UTC")
+
+    requests = len(bucket)
+    symbols._tables.clear()
+    assert fetch_all_symbols("futures/um", source="bucket") == info
+    assert len(bucket) == requests
+    with pytest.raises(ValueError):
+        fetch_all_symbols("futures/um", source="ccxt")
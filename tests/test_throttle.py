@@ -0,0 +1,63 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from quantease_binance import config
+from quantease_binance.exceptions import NetworkError, RateLimited
+from quantease_binance.throttle import AdaptiveLimiter
+from quantease_binance.utils import download_data_async
+from tests.conftest import make_klines_zip
+
+
+def test_adaptive_limiter(monkeypatch):
+    monkeypatch.setattr(config, "THROTTLE_COOLDOWN", 0)
+    limiter = AdaptiveLimiter(max_concurrency=16, max_rate=1000)
+    peak = 0
+
+    async def request(fail=None):
+        nonlocal peak
+        async with limiter.slot() as slot:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.001)
+            slot.responded()
+            if fail is not None:
+                raise fail
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(300)])
+        assert limiter.concurrency == 16
+        assert peak <= 16
+
+        with pytest.raises(RateLimited):
+            await request(RateLimited("HTTP 429", retry_after=0.2))
+        assert limiter.concurrency == 8
+        assert limiter.rate < 1000
+
+        start = asyncio.get_running_loop().time()
+        await request()
+        assert asyncio.get_running_loop().time() - start >= 0.2
+
+        with pytest.raises(NetworkError):
+            await request(NetworkError("HTTP 503"))
+        assert limiter.concurrency == (8 + 1 / 8) / 2
+
+    asyncio.run(run())
+
+
+def test_download_backs_off_when_throttled(cache_dir, data_server):
+    name = "/BTCUSDT-1m-2022-01.zip"
+    data_server.files[name] = make_klines_zip(1640995200000, 10)
+    data_server.statuses[name] = [429]
+    limiter = AdaptiveLimiter(max_concurrency=8)
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await download_data_async(
+                "klines", "UTC", data_server.url + name, session=session, limiter=limiter
+            )
+
+    assert len(asyncio.run(run())) == 10
+    assert limiter.backoffs == 1
+    assert limiter.concurrency == 1 + 1 / 1
+    assert limiter.in_flight == 0
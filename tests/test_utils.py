@@ -1,7 +1,24 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
 import pytest
 from pandas import Timestamp, Timedelta
 
-from quantease_binance.utils import gen_data_url, gen_dates
+from quantease_binance import config, utils
+from quantease_binance.utils import (
+    PartialDownload,
+    compact_frame,
+    download_data,
+    download_data_async,
+    gen_data_url,
+    gen_dates,
+    load_klines,
+    load_metrics,
+    load_trades,
+)
+from tests.conftest import make_klines_zip, make_zip
 
 
 def test_gen_data_url():
@@ -55,3 +72,204 @@ def test_gen_dates():
             Timestamp("2021-12-1"),
             "1m",
         )
+
+
+def test_gen_dates_probes_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    probed = []
+
+    def fake_exists_month(url, max_retries=5, client=None):
+        probed.append(url)
+        return "2022-03" not in url and "2021-12" not in url
+
+    def no_listing(*args):
+        raise utils.NetworkError("offline")
+
+    monkeypatch.setattr(utils, "exists_month", fake_exists_month)
+    monkeypatch.setattr(utils, "get_file_index", no_listing)
+
+    with pytest.warns(UserWarning):
+        months, days = gen_dates(
+            "klines", "spot", "BTCUSDT", Timestamp("2021-12-10"), Timestamp("2022-3-3"), "1m"
+        )
+    assert months == [Timestamp("2022-1"), Timestamp("2022-2")]
+    assert days == [Timestamp("2022-3-1"), Timestamp("2022-3-2")]
+    assert len(probed) == 4
+
+    # existing months are memoized on disk, missing ones until the TTL expires
+    gen_dates(
+        "klines", "spot", "BTCUSDT", Timestamp("2022-1-10"), Timestamp("2022-2-3"), "1m"
+    )
+    assert len(probed) == 4
+    monkeypatch.setattr(config, "PROBE_NEGATIVE_TTL", 0)
+    with pytest.warns(UserWarning):
+        gen_dates(
+            "klines", "spot", "BTCUSDT", Timestamp("2021-12-10"), Timestamp("2022-2-3"), "1m"
+        )
+    assert len(probed) == 5
+
+
+def test_probe_months_from_threads(monkeypatch, cache_dir):
+    monkeypatch.setattr(utils, "exists_month", lambda url, max_retries=5, client=None: True)
+    urls = [f"https://example.com/{i}.zip" for i in range(64)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda i: utils.probe_months(urls[i : i + 4]), range(0, 64, 4)))
+    # every answer of every thread is kept
+    assert sorted(utils.load_availability()) == sorted(urls)
+
+
+def test_download_data_resumes(monkeypatch, cache_dir, data_server):
+    name = "/data/spot/monthly/klines/BTCUSDT/1m/BTCUSDT-1m-2022-01.zip"
+    url = data_server.url + name
+    content = make_klines_zip(1640995200000, 5000)
+    data_server.files[name] = content
+    monkeypatch.setattr(config, "DOWNLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(utils.time, "sleep", lambda seconds: None)
+
+    # the connection drops halfway, the retry asks for the rest only
+    data_server.cut[name] = len(content) // 2
+    df = download_data("klines", "UTC", url)
+    assert df.equals(load_klines("UTC", content))
+    assert data_server.ranges[0] is None
+    assert 0 < int(data_server.ranges[1][len("bytes="):-1]) <= len(content) // 2
+    assert not PartialDownload(url).path.exists()
+
+    # a transfer cut short by a previous process is resumed
+    partial = PartialDownload(url)
+    partial.begin(200, {"ETag": f'"{hashlib.md5(content).hexdigest()}"'})
+    partial.write(content[:1000])
+    partial.pause()
+    partial.release()
+    assert PartialDownload(url).offset == 1000
+
+    async def download_async():
+        async with aiohttp.ClientSession() as session:
+            return await download_data_async("klines", "UTC", url, session=session)
+
+    assert asyncio.run(download_async()).equals(df)
+    assert not partial.path.exists()
+
+    # a partial file of an older version of the file is thrown away
+    data_server.files[name] = make_klines_zip(1640995200000, 10)
+    partial = PartialDownload(url)
+    partial.begin(200, {"ETag": '"stale"'})
+    partial.write(content[:1000])
+    partial.pause()
+    partial.release()
+    assert len(download_data("klines", "UTC", url)) == 10
+
+    # a 206 for another range than the partial file's is thrown away instead of resent forever
+    partial = PartialDownload(url)
+    partial.begin(200, {"ETag": '"abc"'})
+    partial.write(content[:1000])
+    partial.pause()
+    partial.release()
+    with pytest.raises(utils.NetworkError):
+        PartialDownload(url).begin(206, {"Content-Range": f"bytes 0-{len(content) - 1}/{len(content)}"})
+    assert not partial.path.exists() and PartialDownload(url).offset == 0
+
+    # without ETag or Last-Modified a complete transfer is parsed, a cut one starts over
+    data_server.files[name] = content
+    data_server.etags = False
+    data_server.ranges.clear()
+    assert download_data("klines", "UTC", url).equals(df)
+    data_server.cut[name] = len(content) // 2
+    assert asyncio.run(download_async()).equals(df)
+    assert data_server.ranges == [None, None, None]
+    assert not PartialDownload(url).path.exists()
+
+    # a download of a url being downloaded elsewhere leaves the other's partial file alone
+    data_server.etags = True
+    data_server.cut.clear()
+    with PartialDownload(url) as partial:
+        partial.begin(200, {"ETag": f'"{hashlib.md5(content).hexdigest()}"'})
+        partial.write(content[:1000])
+        partial.pause()
+        with PartialDownload(url) as other:
+            assert other.path != partial.path and other.offset == 0
+        assert not other.path.exists()
+        assert download_data("klines", "UTC", url).equals(df)
+        assert partial.path.exists() and partial.path.stat().st_size == 1000
+    assert PartialDownload(url).offset == 1000
+
+
+@pytest.mark.parametrize("engine", ["pyarrow", "pandas"])
+def test_load_csv_schema(monkeypatch, engine):
+    monkeypatch.setattr(config, "CSV_ENGINE", engine)
+
+    # spot trades have no header and a trailing is_best_match column
+    spot = make_zip("1,100.5,0.1,10.05,1640995200000,True,True\n2,100.6,0.2,20.12,1640995201000,False,True\n")
+    # futures trades have a header and no is_best_match column
+    futures = make_zip(
+        "id,price,qty,quote_qty,time,is_buyer_maker\n"
+        "1,100.5,0.1,10.05,1640995200000,true\n2,100.6,0.2,20.12,1640995201000,false\n"
+    )
+    for content in (spot, futures):
+        df = load_trades("Asia/Shanghai", content)
+        assert list(df.columns) == ["id", "price", "qty", "base_qty", "time", "is_buyer_maker"]
+        assert df.dtypes.to_dict() == {
+            "id": "int64",
+            "price": "float64",
+            "qty": "float64",
+            "base_qty": "float64",
+            "time": "int64",
+            "is_buyer_maker": "bool",
+        }
+        assert df.is_buyer_maker.tolist() == [True, False]
+        assert df.index[0] == Timestamp("2022-1-1 8:00", tz="Asia/Shanghai")
+
+    metrics = make_zip(
+        "create_time,symbol,sum_open_interest,sum_open_interest_value,count_toptrader_long_short_ratio,"
+        "sum_toptrader_long_short_ratio,count_long_short_ratio,sum_taker_long_short_vol_ratio\n"
+        "2024-07-01 00:05:00,BTCUSDT,1.0,2.0,3.0,4.0,5.0,6.0\n"
+    )
+    df = load_metrics("UTC", metrics)
+    assert df.symbol.tolist() == ["BTCUSDT"]
+    assert df.index[0] == Timestamp("2024-7-1 0:05", tz="UTC")
+
+
+def test_load_csv_in_blocks(monkeypatch):
+    content = make_klines_zip(1640995200000, 1000)
+    df = load_klines("UTC", content)
+    monkeypatch.setattr(config, "CSV_BLOCK_SIZE", 1024)
+    assert load_klines("UTC", content).equals(df)
+    assert len(df) == 1000
+
+
+def test_compact_frame():
+    klines = load_klines("UTC", make_klines_zip(1640995200000, 100))
+    compact = compact_frame("klines", klines)
+    assert "open_time" not in compact and "ignore" not in compact
+    assert compact.close.dtype == "float32"
+    assert compact["count"].dtype == "int32"
+    assert compact.index.equals(klines.index)
+    assert compact.memory_usage(deep=True).sum() < klines.memory_usage(deep=True).sum() / 2
+
+    metrics = load_metrics(
+        "UTC",
+        make_zip("2024-07-01 00:05:00,BTCUSDT,1,2,3,4,5,6\n2024-07-01 00:10:00,BTCUSDT,1,2,3,4,5,6\n"),
+    )
+    assert compact_frame("metrics", metrics).symbol.dtype == "category"
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", None])
+def test_download_data_async_decode_pool(monkeypatch, cache_dir, data_server, executor):
+    monkeypatch.setattr(config, "DECODE_EXECUTOR", executor)
+    monkeypatch.setattr(config, "DECODE_WORKERS", 2)
+    monkeypatch.setattr(config, "DECODE_QUEUE_SIZE", 1)
+    contents = {f"/BTCUSDT-1m-2022-0{i}.zip": make_klines_zip(1640995200000, 100 * i) for i in range(1, 4)}
+    data_server.files.update(contents)
+
+    async def download_all():
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(
+                *[download_data_async("klines", "UTC", data_server.url + name, session=session) for name in contents]
+            )
+
+    for df, content in zip(asyncio.run(download_all()), contents.values()):
+        assert df.equals(load_klines("UTC", content))
+        assert df.attrs["checksum"] == hashlib.sha256(content).hexdigest()
+    # one file at a time went through download and decoding
+    paths = [path for _, path in data_server.requests]
+    assert sorted(paths[::2]) == list(contents)
+    assert paths[1::2] == [name + ".CHECKSUM" for name in paths[::2]]